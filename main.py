@@ -1,5 +1,28 @@
+import argparse
+from src.api.batch import download_feature_types
+
+
 def main():
-    print("Hello from nvdb-skripting!")
+    parser = argparse.ArgumentParser(description="Download data from NVDB.")
+    subparsers = parser.add_subparsers(dest="command")
+
+    batch = subparsers.add_parser("batch", help="Download several feature types with the same query parameters.")
+    batch.add_argument("feature_type_ids", nargs="+", type=int, help="Feature type ids, e.g. 105 487")
+    batch.add_argument("--output-dir", default="output", help="Directory for the files and run_summary.json")
+    batch.add_argument("--file-type", default="parquet", help="csv, txt, excel, parquet, geoparquet, arrow or gpkg")
+    batch.add_argument("--environment", default="prod", help="prod, test, stm or utv")
+    batch.add_argument("--download-workers", type=int, default=4, help="Feature types downloading at the same time")
+    batch.add_argument("--populate-workers", type=int, default=None, help="Processes for populate_columns, defaults to the number of CPUs")
+    batch.add_argument("--param", action="append", default=[], metavar="KEY=VALUE", help="API query parameter, e.g. --param fylke=50. Can be repeated.")
+
+    args = parser.parse_args()
+    match args.command:
+        case "batch":
+            api_query_parameters = dict(param.split("=", 1) for param in args.param)
+            download_feature_types(args.feature_type_ids, args.output_dir, file_type=args.file_type, environment=args.environment,
+                                   max_download_workers=args.download_workers, max_populate_workers=args.populate_workers, **api_query_parameters)
+        case _:
+            parser.print_help()
 
 
 if __name__ == "__main__":
@@ -1,13 +1,129 @@
+use numpy::ndarray::ArrayView2;
+use numpy::{IntoPyArray, PyArray1, PyReadonlyArray2};
+use pyo3::exceptions::PyValueError;
 use pyo3::prelude::*;
-use geo::geometry::Point, HaversineDistance;
 
+// Same mean earth radius as the NumPy fallback in src/distance/distance.py.
+const EARTH_RADIUS: f64 = 6371008.8;
+
+fn check_coordinates(a: &ArrayView2<f64>, name: &str) -> PyResult<()> {
+    if a.ncols() != 2 && a.ncols() != 3 {
+        return Err(PyValueError::new_err(format!("{name} must be an N×2 or N×3 array, got {} columns", a.ncols())));
+    }
+    Ok(())
+}
+
+fn check_pairs(a: &ArrayView2<f64>, b: &ArrayView2<f64>) -> PyResult<()> {
+    check_coordinates(a, "a")?;
+    check_coordinates(b, "b")?;
+    if a.nrows() != b.nrows() || a.ncols() != b.ncols() {
+        return Err(PyValueError::new_err(format!("a and b must have the same shape, got {:?} and {:?}", a.shape(), b.shape())));
+    }
+    Ok(())
+}
+
+// Great circle distance in metres between (lon, lat) in degrees, height is ignored.
+fn haversine(a: &[f64], b: &[f64]) -> f64 {
+    let (lon1, lat1, lon2, lat2) = (a[0].to_radians(), a[1].to_radians(), b[0].to_radians(), b[1].to_radians());
+    let h = ((lat2 - lat1) / 2.0).sin().powi(2) + lat1.cos() * lat2.cos() * ((lon2 - lon1) / 2.0).sin().powi(2);
+    2.0 * EARTH_RADIUS * h.sqrt().min(1.0).asin()
+}
+
+// Euclidean distance in the units of the projection (metres for UTM33), with height if there are three columns.
+fn planar(a: &[f64], b: &[f64]) -> f64 {
+    a.iter().zip(b).map(|(x, y)| (x - y) * (x - y)).sum::<f64>().sqrt()
+}
+
+fn metric_function(metric: &str) -> PyResult<fn(&[f64], &[f64]) -> f64> {
+    match metric {
+        "haversine" => Ok(haversine),
+        "planar" => Ok(planar),
+        _ => Err(PyValueError::new_err(format!("Unknown metric '{metric}', expected 'haversine' or 'planar'"))),
+    }
+}
+
+// The coordinates as one borrowed slice, row after row. as_coordinates in distance.py makes every array
+// C-contiguous, so the kernels read NumPy's memory directly and each row is a chunk of ncols values.
+fn coordinates<'a>(array: &'a PyReadonlyArray2<'_, f64>, name: &str) -> PyResult<&'a [f64]> {
+    array.as_slice().map_err(|_| PyValueError::new_err(format!("{name} must be a C-contiguous float64 array, see as_coordinates")))
+}
+
+fn point_to_segment(p: &[f64], a: &[f64], b: &[f64]) -> f64 {
+    let (mut dot, mut length_squared) = (0.0, 0.0);
+    for k in 0..p.len() {
+        let ab = b[k] - a[k];
+        dot += (p[k] - a[k]) * ab;
+        length_squared += ab * ab;
+    }
+    let t = if length_squared > 0.0 { (dot / length_squared).clamp(0.0, 1.0) } else { 0.0 };
+    (0..p.len()).map(|k| (p[k] - a[k] - t * (b[k] - a[k])).powi(2)).sum::<f64>().sqrt()
+}
+
+/// Distance between row i of a and row i of b, for N×2 or N×3 arrays.
+#[pyfunction]
+fn point_to_point_distance<'py>(py: Python<'py>, a: PyReadonlyArray2<'py, f64>, b: PyReadonlyArray2<'py, f64>, metric: &str) -> PyResult<Bound<'py, PyArray1<f64>>> {
+    check_pairs(&a.as_array(), &b.as_array())?;
+    let columns = a.as_array().ncols();
+    let (a, b) = (coordinates(&a, "a")?, coordinates(&b, "b")?);
+    let distance = metric_function(metric)?;
+    let result: Vec<f64> = py.allow_threads(|| a.chunks_exact(columns).zip(b.chunks_exact(columns)).map(|(p, q)| distance(p, q)).collect());
+    Ok(result.into_pyarray_bound(py))
+}
+
+/// Index of and distance to the nearest row of b for every row of a.
+#[pyfunction]
+fn nearest_point<'py>(py: Python<'py>, a: PyReadonlyArray2<'py, f64>, b: PyReadonlyArray2<'py, f64>, metric: &str) -> PyResult<(Bound<'py, PyArray1<i64>>, Bound<'py, PyArray1<f64>>)> {
+    let (a_view, b_view) = (a.as_array(), b.as_array());
+    check_coordinates(&a_view, "a")?;
+    check_coordinates(&b_view, "b")?;
+    if a_view.ncols() != b_view.ncols() || b_view.nrows() == 0 {
+        return Err(PyValueError::new_err("b must be non-empty and have as many columns as a"));
+    }
+    let columns = a_view.ncols();
+    let (a, b) = (coordinates(&a, "a")?, coordinates(&b, "b")?);
+    let distance = metric_function(metric)?;
+    let (indices, distances): (Vec<i64>, Vec<f64>) = py.allow_threads(|| {
+        a.chunks_exact(columns)
+            .map(|p| {
+                b.chunks_exact(columns).enumerate().fold((-1i64, f64::INFINITY), |best, (j, q)| {
+                    let d = distance(p, q);
+                    if d < best.1 { (j as i64, d) } else { best }
+                })
+            })
+            .unzip()
+    });
+    Ok((indices.into_pyarray_bound(py), distances.into_pyarray_bound(py)))
+}
+
+/// Planar distance from every row of points to the linestring through the rows of linestring.
 #[pyfunction]
-fn point_to_point_distance(a: usize, b: usize) -> PyResult<String> {
-    Ok((a + b).to_string())
+fn point_to_linestring_distance<'py>(py: Python<'py>, points: PyReadonlyArray2<'py, f64>, linestring: PyReadonlyArray2<'py, f64>) -> PyResult<Bound<'py, PyArray1<f64>>> {
+    let (points_view, linestring_view) = (points.as_array(), linestring.as_array());
+    check_coordinates(&points_view, "points")?;
+    check_coordinates(&linestring_view, "linestring")?;
+    if points_view.ncols() != linestring_view.ncols() || linestring_view.nrows() < 2 {
+        return Err(PyValueError::new_err("linestring needs at least two points and as many columns as points"));
+    }
+    let columns = points_view.ncols();
+    let (points, linestring) = (coordinates(&points, "points")?, coordinates(&linestring, "linestring")?);
+    let result: Vec<f64> = py.allow_threads(|| {
+        points
+            .chunks_exact(columns)
+            .map(|p| {
+                // Segment k runs from vertex k to vertex k + 1, both borrowed from the linestring array.
+                (0..linestring.len() / columns - 1)
+                    .map(|k| point_to_segment(p, &linestring[k * columns..(k + 1) * columns], &linestring[(k + 1) * columns..(k + 2) * columns]))
+                    .fold(f64::INFINITY, f64::min)
+            })
+            .collect()
+    });
+    Ok(result.into_pyarray_bound(py))
 }
 
 #[pymodule]
-fn nvdb_rust(_py: Python, m: &PyModule) -> PyResult<()> {
+fn nvdb_rust(m: &Bound<'_, PyModule>) -> PyResult<()> {
     m.add_function(wrap_pyfunction!(point_to_point_distance, m)?)?;
+    m.add_function(wrap_pyfunction!(nearest_point, m)?)?;
+    m.add_function(wrap_pyfunction!(point_to_linestring_distance, m)?)?;
     Ok(())
 }
@@ -1,2 +1,6 @@
 # -*- coding: utf-8 -*-
-from .download_nvdb_data import FeatureTypeDownloader, RoadNetworkDownloader
\ No newline at end of file
+from .download_nvdb_data import FeatureTypeDownloader, RoadNetworkDownloader
+from .database_sink import DatabaseSink
+from .page_decoder import page_fields, ROAD_SEGMENT_FIELDS
+from .query import Query
+from .relationships import RelationshipGraph
\ No newline at end of file
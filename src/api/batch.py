@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import time
+import pandas as pd
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from .download_nvdb_data import FeatureTypeDownloader
+from .http_session import get_session
+from .query import Query
+
+SUMMARY_FILE : str = "run_summary.json"
+
+def populate_objects(feature_type_id: int, objects: pd.DataFrame, attributes: list, parents: list, children: list, populate_kwargs: dict) -> tuple[pd.DataFrame, float]:
+    """Run populate_columns in a worker process. The catalogue lookups are done up front, so the worker makes no API calls."""
+    start_time : float = time.time()
+    downloader = FeatureTypeDownloader(feature_type_id)
+    downloader.objects = objects
+    downloader.attributes, downloader.parents, downloader.children = attributes, parents, children
+    downloader.populate_columns(**populate_kwargs)
+    return downloader.objects, time.time() - start_time
+
+def download_feature_types(feature_type_ids: list[int], output_dir: str, file_type: str = "parquet", environment: str = "prod", query: Query|None = None,
+                           max_download_workers: int = 4, max_populate_workers: int|None = None, populate_kwargs: dict|None = None, **api_query_parameters: str) -> list[dict]:
+    """Download several feature types with the same query parameters, writing one file per type and a run summary.
+
+    Downloads run on a thread pool sharing one HTTP connection pool and the cached data catalogue. As soon as a
+    type is downloaded, its populate_columns runs in a process pool while the other types are still downloading,
+    and its result is exported to output_dir/vegobjekter_<id>. Returns the summary, also written to output_dir/run_summary.json.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    get_session(pool_maxsize=max(16, 2 * max_download_workers))
+    populate_kwargs = populate_kwargs or {}
+    summary : dict[int, dict] = {feature_type_id: {"feature_type_id": feature_type_id, "status": "pending"} for feature_type_id in feature_type_ids}
+    downloaders : dict[int, FeatureTypeDownloader] = {}
+    run_start : float = time.time()
+
+    def download(feature_type_id: int) -> bool:
+        start_time : float = time.time()
+        downloader = FeatureTypeDownloader(feature_type_id, environment, query=query, **api_query_parameters)
+        downloaders[feature_type_id] = downloader
+        # A page that cannot be fetched raises, and the type is reported as "download failed" instead of "no objects".
+        downloaded : bool = downloader.download()
+        if downloaded:
+            downloader.get_attributes_from_data_catalogue()
+            if downloader.attributes is None:
+                raise RuntimeError(f"Could not get the attributes of feature type {feature_type_id} from the data catalogue.")
+            downloader.get_relationships_from_data_catalogue()
+        summary[feature_type_id]["download_seconds"] = round(time.time() - start_time, 2)
+        return downloaded
+
+    with ThreadPoolExecutor(max_workers=max_download_workers) as download_pool, ProcessPoolExecutor(max_workers=max_populate_workers) as populate_pool:
+        pending : dict[Future, tuple[str, int]] = {download_pool.submit(download, feature_type_id): ("download", feature_type_id) for feature_type_id in feature_type_ids}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, feature_type_id = pending.pop(future)
+                result : dict = summary[feature_type_id]
+                if future.exception() is not None:
+                    result["status"] = f"{stage} failed: {future.exception()}"
+                    print(f"Feature type {feature_type_id}: {result['status']}")
+                    continue
+                downloader : FeatureTypeDownloader = downloaders[feature_type_id]
+                match stage:
+                    case "download":
+                        if not future.result():
+                            result["status"] = "no objects"
+                            result["rows"] = 0
+                            continue
+                        populate_future = populate_pool.submit(populate_objects, feature_type_id, downloader.objects, downloader.attributes, downloader.parents, downloader.children, populate_kwargs)
+                        pending[populate_future] = ("populate", feature_type_id)
+                    case "populate":
+                        downloader.objects, result["populate_seconds"] = future.result()
+                        result["populate_seconds"] = round(result["populate_seconds"], 2)
+                        file_name : str = os.path.join(output_dir, f"vegobjekter_{feature_type_id}")
+                        result["rows"] = len(downloader.objects)
+                        result["columns"] = len(downloader.objects.columns)
+                        try:
+                            downloader.export(file_name, file_type)
+                        except Exception as error: # Disk full, bad path, Excel row limit, ... the other types carry on
+                            result["status"] = f"export failed: {error}"
+                            print(f"Feature type {feature_type_id}: {result['status']}")
+                        else:
+                            result["file_name"] = file_name
+                            result["status"] = "ok"
+                            print(f"Feature type {feature_type_id}: {result['rows']} objects written to {file_name}")
+                        finally:
+                            downloader.objects = pd.DataFrame() # Free the memory, the result is on disk or lost
+
+    results : list[dict] = list(summary.values())
+    with open(os.path.join(output_dir, SUMMARY_FILE), "w", encoding="utf-8") as fp:
+        json.dump({
+            "feature_type_ids": feature_type_ids,
+            "query_parameters": downloaders[feature_type_ids[0]].api_query_parameters if feature_type_ids and feature_type_ids[0] in downloaders else api_query_parameters,
+            "file_type": file_type,
+            "seconds": round(time.time() - run_start, 2),
+            "results": results
+        }, fp, ensure_ascii=False, indent=4)
+    return results
@@ -1,19 +1,25 @@
-import requests
+import io
 import json
+from itertools import islice
+from typing import Iterator
+import numpy as np
+import pandas as pd
+from .data_catalogue import get_version
+from .http_session import dumps
+
+# Id and version columns of FeatureTypeDownloader.objects, after and before populate_columns.
+ID_COLUMNS : list[tuple[str, str]] = [('nvdbId', 'Versjon'), ('id', 'metadata.versjon')]
 
 def get_current_data_catalogue_version() -> str:
-    r = requests.get("https://nvdbapiles.atlas.vegvesen.no/datakatalog/api/v1/versjon")
-    if r.status_code == 200:
-        r = r.json()
-        return r.get("versjon", "2.41")
-    return "2.41"
+    # Asked from the API once per process, falling back to the newest cached catalogue when offline.
+    return get_version() or "2.41"
 
 def ensure_unique_objects(func):
     def wrapper(self, *args, **kwargs):
         nytt_obj = func(self, *args, **kwargs)
-        in_list = any(obj.get("nvdbId") == nytt_obj.get("nvdbId") for obj in self.objects)
+        in_list = nytt_obj.get("nvdbId") in self.nvdb_ids
         if not in_list:
-            self.objects.append(nytt_obj)
+            self.append_object(nytt_obj)
         else:
             raise Exception(f"Found a duplicate of {nytt_obj.get("nvdbId")}-{nytt_obj.get("versjon")} in the changeset.")
     return wrapper
@@ -21,33 +27,145 @@ def ensure_unique_objects(func):
 def ensure_unique_objectversion(func):
     def wrapper(self, *args, **kwargs):
         nytt_obj = func(self, *args, **kwargs)
-        in_list = any(obj.get("nvdbId") == nytt_obj.get("nvdbId") and obj.get("versjon") == nytt_obj.get("versjon") for obj in self.objects)
+        in_list = (nytt_obj.get("nvdbId"), nytt_obj.get("versjon")) in self.object_versions
         if not in_list:
-            self.objects.append(nytt_obj)
+            self.append_object(nytt_obj)
     return wrapper
 
 class Changeset:
+    # True when a second version of an nvdbId is an error (ensure_unique_objects), False when only exact nvdbId-versjon duplicates are skipped (ensure_unique_objectversion).
+    unique_nvdb_id : bool = False
+
     def __init__(self, typeId : int):
         self.data_catalogue_version = get_current_data_catalogue_version()
         self.typeId = typeId
         self.objects : list[dict] = []
+        # Hash index over self.objects, so duplicate checks are O(1) instead of a scan of the changeset.
+        self.nvdb_ids : set = set()
+        self.object_versions : set[tuple] = set()
+
+    def append_object(self, obj : dict) -> None:
+        self.objects.append(obj)
+        self.nvdb_ids.add(obj.get("nvdbId"))
+        self.object_versions.add((obj.get("nvdbId"), obj.get("versjon")))
+
+    def changeset_key(self) -> str:
+        return self.__class__.__name__ [0].lower() + self.__class__.__name__[1:]
+
+    def encoded_objects(self, indent : int|None = None) -> Iterator[bytes]:
+        if not indent:
+            yield from map(dumps, self.objects)
+            return
+        encoder = json.JSONEncoder(indent=indent, ensure_ascii=False)
+        for obj in self.objects:
+            yield encoder.encode(obj).encode("utf-8")
+
+    def chunk_objects(self, max_objects : int|None = None, max_bytes : int|None = None, indent : int|None = None) -> Iterator[Iterator[bytes]]:
+        """Split the encoded objects into chunks of at most max_objects objects and max_bytes bytes per changeset.
+
+        Yields one lazy iterator per chunk, each must be consumed before the next chunk is read. An object larger than max_bytes gets a chunk of its own.
+        """
+        overhead : int = len(self.header(indent)) + len(self.footer(indent))
+        separator : int = len(self.separator(indent)) # Written before every object but the first, counted for all of them
+        objects : Iterator[bytes] = self.encoded_objects(indent)
+        pending : list[bytes] = list(islice(objects, 1))
+
+        def chunk() -> Iterator[bytes]:
+            count, size = 0, overhead
+            while pending:
+                obj : bytes = pending[0]
+                if count and ((max_objects and count >= max_objects) or (max_bytes and size + len(obj) + separator > max_bytes)):
+                    return
+                pending.pop()
+                count, size = count + 1, size + len(obj) + separator
+                yield obj
+                pending.extend(islice(objects, 1))
+
+        yield chunk()
+        while pending:
+            yield chunk()
 
-    def save_json(self, path : str) -> bool:
+    def header(self, indent : int|None = None) -> bytes:
+        newline : str = "\n" if indent else ""
+        return ('{' + newline + f'"{self.changeset_key()}":{{"vegobjekter":[' + newline).encode("utf-8")
+
+    def footer(self, indent : int|None = None) -> bytes:
+        newline : str = "\n" if indent else ""
+        return (newline + ']},' + newline + f'"datakatalogversjon":{json.dumps(self.data_catalogue_version)}' + newline + '}').encode("utf-8")
+
+    def separator(self, indent : int|None = None) -> bytes:
+        return b",\n" if indent else b","
+
+    def write_chunk(self, fp, objects : Iterator[bytes], indent : int|None = None) -> None:
+        fp.write(self.header(indent))
+        for i, obj in enumerate(objects):
+            if i:
+                fp.write(self.separator(indent))
+            fp.write(obj)
+        fp.write(self.footer(indent))
+
+    def payloads(self, max_objects : int|None = None, max_bytes : int|None = None) -> Iterator[bytes]:
+        """The changeset as compact JSON request bodies, split by max_objects and max_bytes."""
+        for objects in self.chunk_objects(max_objects, max_bytes):
+            fp = io.BytesIO()
+            self.write_chunk(fp, objects)
+            yield fp.getvalue()
+
+    def save_json(self, path : str, max_objects : int|None = None, max_bytes : int|None = None, indent : int|None = None) -> list[str]:
+        """Write the changeset as JSON, streamed one object at a time so the whole document is never built in memory.
+
+        With max_objects or max_bytes the changeset is split into several files, path_1.json, path_2.json and so on,
+        each a complete changeset within the limits of the write API. Compact unless indent is given.
+        Returns the files written, an empty list if writing failed.
+        """
         if ".json" not in path:
             path = path + ".json"
-        changeset = {
-            self.__class__.__name__ [0].lower() + self.__class__.__name__[1:]: {
-                "vegobjekter" : self.objects
-            },
-            "datakatalogversjon" : self.data_catalogue_version
-        }
+        split : bool = bool(max_objects or max_bytes)
+        stem : str = path[:-len(".json")] if path.endswith(".json") else path
+        paths : list[str] = []
         try:
-            with open(path, "w") as fp:
-                json.dump(changeset, fp, indent=4, ensure_ascii=False)
-            return True
+            for number, objects in enumerate(self.chunk_objects(max_objects, max_bytes, indent), start=1):
+                chunk_path : str = f"{stem}_{number}.json" if split else path
+                with open(chunk_path, "wb") as fp:
+                    self.write_chunk(fp, objects, indent)
+                paths.append(chunk_path)
+            return paths
         except Exception:
-            return False
-        
+            return []
+
+class BulkChangeset:
+    """add_objects for the changesets whose objects are built from nvdbId and versjon alone: Lukk, Gjenopprett and Fjern.
+
+    The changeset class defines build_objects, returning one row per object in the layout of add_object.
+    """
+    def add_objects(self, objects : pd.DataFrame, **values) -> int:
+        """Add every row of objects, e.g. FeatureTypeDownloader.objects filtered to what should be closed.
+
+        values are the other arguments of add_object, each either one value for all rows or a Series/array with one value per row.
+        Duplicates are handled as add_object does. Returns the number of objects added.
+        """
+        id_column, version_column = next(((id_column, version_column) for id_column, version_column in ID_COLUMNS if id_column in objects.columns and version_column in objects.columns), (None, None))
+        if id_column is None:
+            raise KeyError(f"Found no id and version columns in the objects, expected one of: {ID_COLUMNS}.")
+        values = {key: value.to_numpy() if isinstance(value, pd.Series) else value for key, value in values.items()}
+        new_objects : pd.DataFrame = self.build_objects(objects[id_column].astype('int64').to_numpy(), objects[version_column].astype('int64').to_numpy(), **values)
+        if self.unique_nvdb_id:
+            duplicated : np.ndarray = new_objects.duplicated(subset=["nvdbId"]).to_numpy() | new_objects["nvdbId"].isin(self.nvdb_ids).to_numpy()
+        else:
+            in_changeset : list[bool] = [key in self.object_versions for key in zip(new_objects["nvdbId"].tolist(), new_objects["versjon"].tolist())]
+            duplicated = new_objects.duplicated(subset=["nvdbId", "versjon"]).to_numpy() | np.array(in_changeset, dtype=bool)
+        if duplicated.any():
+            if self.unique_nvdb_id:
+                duplicate : pd.Series = new_objects[duplicated].iloc[0]
+                raise Exception(f"Found a duplicate of {duplicate['nvdbId']}-{duplicate['versjon']} in the changeset.")
+            new_objects = new_objects[~duplicated]
+        columns : list[str] = new_objects.columns.tolist()
+        records : list[dict] = [dict(zip(columns, row)) for row in zip(*(new_objects[col].tolist() for col in columns))]
+        self.objects += records
+        self.nvdb_ids.update(new_objects["nvdbId"].tolist())
+        self.object_versions.update(zip(new_objects["nvdbId"].tolist(), new_objects["versjon"].tolist()))
+        return len(records)
+
 class Registrer(Changeset):
     def __init__(self, typeId : int):
         super().__init__(typeId)
@@ -60,10 +178,21 @@ class Oppdater(Changeset):
     def add_object(self, nvdbId : int, versjon : int, stedfesting : dict|bool = False, egenskaper : list|bool = False):
         pass
 
-class Lukk(Changeset):
+class Lukk(BulkChangeset, Changeset):
+    unique_nvdb_id = True
+
     def __init__(self, typeId : int):
         super().__init__(typeId)
 
+    def build_objects(self, nvdbId : np.ndarray, versjon : np.ndarray, kaskade : bool|np.ndarray, lukkedato : str|np.ndarray) -> pd.DataFrame:
+        return pd.DataFrame({
+            "lukkedato" : np.broadcast_to(lukkedato, nvdbId.shape),
+            "kaskadelukking" : np.where(kaskade, "JA", "NEI") if np.ndim(kaskade) else ("JA" if kaskade else "NEI"),
+            "typeId" : self.typeId,
+            "nvdbId" : nvdbId,
+            "versjon" : versjon
+        })
+
     @ensure_unique_objects
     def add_object(self, nvdbId : int, versjon : int, kaskade : bool, lukkedato : str) -> dict:
         return {
@@ -74,10 +203,20 @@ class Lukk(Changeset):
             "versjon" : versjon
         }
 
-class Gjenopprett(Changeset):
+class Gjenopprett(BulkChangeset, Changeset):
+    unique_nvdb_id = True
+
     def __init__(self, typeId : int):
         super().__init__(typeId)
 
+    def build_objects(self, nvdbId : np.ndarray, versjon : np.ndarray, kaskade : bool|np.ndarray) -> pd.DataFrame:
+        return pd.DataFrame({
+            "kaskadegjenoppretting" : np.where(kaskade, "JA", "NEI") if np.ndim(kaskade) else ("JA" if kaskade else "NEI"),
+            "typeId" : self.typeId,
+            "nvdbId" : nvdbId,
+            "versjon" : versjon
+        })
+
     @ensure_unique_objects
     def add_object(self, nvdbId : int, versjon : int, kaskade : bool) -> dict:
         return {
@@ -91,10 +230,18 @@ class Korriger(Changeset):
     def __init__(self, typeId : int):
         super().__init__(typeId)
 
-class Fjern(Changeset):
+class Fjern(BulkChangeset, Changeset):
     def __init__(self, typeId : int):
         super().__init__(typeId)
 
+    def build_objects(self, nvdbId : np.ndarray, versjon : np.ndarray, kaskade : bool|np.ndarray) -> pd.DataFrame:
+        return pd.DataFrame({
+            "kaskadefjerning" : np.where(kaskade, "JA", "NEI") if np.ndim(kaskade) else ("JA" if kaskade else "NEI"),
+            "typeId" : self.typeId,
+            "nvdbId" : nvdbId,
+            "versjon" : versjon
+        })
+
     @ensure_unique_objectversion
     def add_object(self, nvdbId : int, versjon : int, kaskade : bool) -> dict:
         return {
@@ -1,18 +1,52 @@
 import requests
 from bs4 import BeautifulSoup
 import json
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from .changeset_validator import validate_changeset
 
-def authenticate(username : str, password : str, miljø : str, x_client : str) -> str:
+FINISHED_FREMDRIFT : set[str] = {"UTFØRT", "UTFØRT_OG_ETTERBEHANDLET", "AVVIST", "KANSELLERT"}
+SUCCESSFUL_FREMDRIFT : set[str] = {"UTFØRT", "UTFØRT_OG_ETTERBEHANDLET"}
+
+def get_base_url(miljø : str) -> str:
     match miljø:
         case 'test':
-            base_url = "https://nvdbapiskriv.test.atlas.vegvesen.no/"
+            return "https://nvdbapiskriv.test.atlas.vegvesen.no/"
         case 'stm':
-            base_url = "https://nvdbapiskriv-stm.utv.atlas.vegvesen.no/"
+            return "https://nvdbapiskriv-stm.utv.atlas.vegvesen.no/"
         case 'utv':
-            base_url = "https://nvdbapiskriv.utv.atlas.vegvesen.no/"
+            return "https://nvdbapiskriv.utv.atlas.vegvesen.no/"
+        case _:
+            return "https://nvdbapiskriv.atlas.vegvesen.no/"
+
+def get_read_base_url(miljø : str) -> str:
+    """The read API of the environment, whose data catalogue changesets for it are checked against."""
+    match miljø:
+        case 'test':
+            return "https://nvdbapiles.test.atlas.vegvesen.no/"
+        case 'stm' | 'utv':
+            return "https://nvdbapiles.utv.atlas.vegvesen.no/"
         case _:
-            base_url = "https://nvdbapiskriv.atlas.vegvesen.no/"
+            return "https://nvdbapiles.atlas.vegvesen.no/"
+
+def create_session(id_token : str, x_client : str, pool_maxsize : int = 16) -> requests.Session:
+    """One authenticated session for all changesets, so concurrent submissions reuse the same connections."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_maxsize)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({
+        "Accept": "application/json",
+        "Authorization": f"Bearer {id_token}",
+        "X-Client": x_client
+    })
+    return session
+
+def authenticate(username : str, password : str, miljø : str, x_client : str, session : requests.Session|None = None, base_url : str|None = None) -> str:
+    """The id token for the write API, or "" if the login failed. base_url overrides the environment, e.g. for a local stub."""
+    base_url = base_url or get_base_url(miljø)
 
     url = f"{base_url}rest/v1/oidc/authenticate"
     payload = {
@@ -24,7 +58,7 @@ def authenticate(username : str, password : str, miljø : str, x_client : str) -
         "Content-Type": "application/json",
         "X-Client": x_client
         }
-    response = requests.post(url, json=payload, headers=headers)
+    response = (session or requests).post(url, json=payload, headers=headers)
     if response.status_code == 200:
         soup = BeautifulSoup(response.text, 'xml')
         id_token = soup.find('idToken')
@@ -33,21 +67,16 @@ def authenticate(username : str, password : str, miljø : str, x_client : str) -
     return ""
 
 class Changeset:
-    def __init__(self, path : str, miljø : str, id_token : str, x_client : str, dryrun : bool):
+    def __init__(self, path : str, miljø : str, id_token : str, x_client : str, dryrun : bool, session : requests.Session|None = None, base_url : str|None = None):
         self.X_request_ID = str(uuid.uuid4())
-        match miljø:
-            case 'test':
-                self.base_url = "https://nvdbapiskriv.test.atlas.vegvesen.no/"
-            case 'stm':
-                self.base_url = "https://nvdbapiskriv-stm.utv.atlas.vegvesen.no/"
-            case 'utv':
-                self.base_url = "https://nvdbapiskriv.utv.atlas.vegvesen.no/"
-            case _:
-                self.base_url = "https://nvdbapiskriv.atlas.vegvesen.no/"
-        with open(path, 'r') as file:
+        self.base_url = base_url or get_base_url(miljø)
+        with open(path, 'r', encoding='utf-8') as file:
             self.endringssett = json.load(file)
         self.id_token = id_token
         self.x_client = x_client
+        self.session = session or requests.Session()
+        self.avvist_årsak : str|None = None
+        self.fremdrift_url : str|bool = False
 
         if dryrun:
             self.dryrun = "JA"
@@ -65,7 +94,7 @@ class Changeset:
             }
         payload = self.endringssett
         
-        response = requests.post(url, json=payload, headers=headers)
+        response = self.session.post(url, json=payload, headers=headers)
         if response.status_code == 200:
             response = response.json()
             fremdrift = response.get("fremdrift")
@@ -73,6 +102,7 @@ class Changeset:
 
             if fremdrift == "UTFØRT":
                 return True
+            self.avvist_årsak = avvist_årsak
             print(avvist_årsak)
         return False
     
@@ -88,10 +118,11 @@ class Changeset:
             }
         payload = self.endringssett
         
-        response = requests.post(url, json=payload, headers=headers)
+        response = self.session.post(url, json=payload, headers=headers)
         if response.status_code == 201:
             response = response.json()
             self.start_behandling_url = next((i.get("src") for i in response if i.get("rel") == "start"), False)
+            self.fremdrift_url = next((i.get("src") for i in response if i.get("rel") == "fremdrift"), False)
             return True
         return False
     
@@ -105,7 +136,114 @@ class Changeset:
             "X-Client": self.x_client,
             "X-Request-ID": self.X_request_ID
         }
-        response = requests.post(url, headers=headers) # type: ignore
+        response = self.session.post(url, headers=headers) # type: ignore
         if response.status_code == 202:
             return True
         return False
+
+    def fremdrift(self) -> str|None:
+        url = self.fremdrift_url
+        if not url:
+            return None
+        headers = {
+            "Accept": "application/json",
+            "Authorization": f"Bearer {self.id_token}",
+            "X-Client": self.x_client,
+            "X-Request-ID": self.X_request_ID
+        }
+        response = self.session.get(url, headers=headers) # type: ignore
+        if response.status_code != 200:
+            return None
+        try:
+            fremdrift = response.json()
+        except ValueError:
+            fremdrift = response.text
+        if isinstance(fremdrift, dict):
+            fremdrift = fremdrift.get("fremdrift")
+        return str(fremdrift).strip('"') if fremdrift else None
+
+    def wait(self, poll_interval : float = 1.0, max_poll_interval : float = 30.0, timeout : float = 3600.0) -> str|None:
+        """Poll fremdrift until the changeset is finished, doubling the interval up to max_poll_interval. Returns the last fremdrift.
+
+        Failed polls (non-200 responses) are retried until timeout. Returns None at once if register gave no fremdrift link.
+        """
+        if not self.fremdrift_url:
+            self.avvist_årsak = "The endringssett has no fremdrift link to poll."
+            return None
+        deadline = time.time() + timeout
+        fremdrift = self.fremdrift()
+        while fremdrift not in FINISHED_FREMDRIFT and time.time() < deadline:
+            time.sleep(min(poll_interval, max(0.0, deadline - time.time())))
+            poll_interval = min(poll_interval * 2, max_poll_interval)
+            fremdrift = self.fremdrift()
+        return fremdrift
+
+def submit_changeset(path : str, miljø : str, id_token : str, x_client : str, dryrun : bool, session : requests.Session|None = None, base_url : str|None = None,
+                     poll_interval : float = 1.0, max_poll_interval : float = 30.0, timeout : float = 3600.0, catalogue_base_url : str|None = None, validate_offline : bool = True) -> dict:
+    """Validate, register, start and wait for one changeset file. Returns its result with the time spent in each step.
+
+    The changeset is first checked offline against the cached data catalogue of catalogue_base_url, by default the
+    read API of miljø, and only sent to the remote validator if it is clean. When base_url is overridden, e.g. for a
+    local stub, the offline check is skipped unless catalogue_base_url is given. validate_offline=False always skips it.
+    """
+    result : dict = {"path": path, "status": "failed", "fremdrift": None, "avvistårsak": None}
+    start_time = time.time()
+    if catalogue_base_url is None and base_url is None:
+        catalogue_base_url = get_read_base_url(miljø)
+    if validate_offline and catalogue_base_url is not None:
+        errors : list[dict] = validate_changeset(path, catalogue_base_url)
+        result["offline_validate_seconds"] = round(time.time() - start_time, 3)
+        if errors:
+            result["status"] = "offline validation failed"
+            result["avvistårsak"] = "; ".join(error["message"] for error in errors[:10]) + (f" ({len(errors)} errors)" if len(errors) > 10 else "")
+            result["errors"] = errors
+            result["seconds"] = result["offline_validate_seconds"]
+            return result
+    try:
+        changeset = Changeset(path, miljø, id_token, x_client, dryrun, session=session, base_url=base_url)
+    except (OSError, ValueError) as error:
+        result["avvistårsak"] = str(error)
+        return result
+    result["X-Request-ID"] = changeset.X_request_ID
+    for step in ("validate", "register", "start"):
+        step_start = time.time()
+        succeeded = getattr(changeset, step)()
+        result[f"{step}_seconds"] = round(time.time() - step_start, 3)
+        if not succeeded:
+            result["status"] = f"{step} failed"
+            result["avvistårsak"] = changeset.avvist_årsak
+            result["seconds"] = round(time.time() - start_time, 3)
+            return result
+    step_start = time.time()
+    fremdrift = changeset.wait(poll_interval, max_poll_interval, timeout)
+    result["wait_seconds"] = round(time.time() - step_start, 3)
+    result["fremdrift"] = fremdrift
+    if not changeset.fremdrift_url:
+        result["status"] = "wait failed"
+        result["avvistårsak"] = changeset.avvist_årsak
+    else:
+        result["status"] = "ok" if fremdrift in SUCCESSFUL_FREMDRIFT else ("timeout" if fremdrift not in FINISHED_FREMDRIFT else "rejected")
+    result["seconds"] = round(time.time() - start_time, 3)
+    return result
+
+def submit_changesets(paths : list[str], miljø : str, id_token : str, x_client : str, dryrun : bool, max_workers : int = 8, base_url : str|None = None,
+                      poll_interval : float = 1.0, max_poll_interval : float = 30.0, timeout : float = 3600.0, catalogue_base_url : str|None = None, validate_offline : bool = True) -> list[dict]:
+    """Submit many changeset files concurrently, e.g. the files from Changeset.save_json with max_objects.
+
+    Each changeset is validated, registered, started and polled until finished on a bounded thread pool,
+    sharing one authenticated session. base_url overrides the environment, e.g. for a local stub of the
+    write API. Changesets failing the offline check against the data catalogue are not sent, see submit_changeset.
+    Returns one result per file, in the order of paths.
+    """
+    session = create_session(id_token, x_client, pool_maxsize=max_workers)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(submit_changeset, path, miljø, id_token, x_client, dryrun, session, base_url, poll_interval, max_poll_interval, timeout, catalogue_base_url, validate_offline) for path in paths]
+        results = []
+        for path, future in zip(paths, futures):
+            try:
+                result = future.result()
+            except requests.RequestException as error:
+                result = {"path": path, "status": "failed", "fremdrift": None, "avvistårsak": str(error)}
+            print(f"{path}: {result['status']}")
+            results.append(result)
+    return results
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+import json
+import re
+from .changeset import Changeset
+from .data_catalogue import PROD_BASE_URL, get_catalogue, get_version
+
+# Changeset kinds of the write API, and which of them identify objects by nvdbId alone (a second version is an error).
+CHANGESET_KEYS : set[str] = {"registrer", "oppdater", "delvisOppdater", "korriger", "delvisKorriger", "lukk", "gjenopprett", "fjern"}
+UNIQUE_NVDB_ID_KEYS : set[str] = {"lukk", "gjenopprett"}
+REQUIRED : str = "PÅKREVD_ABSOLUTT"
+
+VALUE_PATTERNS : dict[str, re.Pattern] = {
+    "Heltall": re.compile(r"^-?\d+$"),
+    "Flyttall": re.compile(r"^-?\d+(\.\d+)?([eE][-+]?\d+)?$"),
+    "Dato": re.compile(r"^\d{4}-\d{2}-\d{2}$"),
+    "Kortdato": re.compile(r"^\d{2}-\d{2}$"),
+    "Klokkeslett": re.compile(r"^\d{2}:\d{2}(:\d{2})?$"),
+    "Boolsk": re.compile(r"^(true|false)$", re.IGNORECASE),
+}
+
+def attribute_rules(feature_type: dict) -> tuple[dict[int, tuple], set[int]]:
+    """Lookup of egenskapstype id to (name, value type, allowed enum ids or None, max text length or None), and the required ids."""
+    rules : dict[int, tuple] = {}
+    required : set[int] = set()
+    for attribute in feature_type.get("egenskapstyper", []):
+        attribute_type : str = attribute.get("egenskapstype", "")
+        allowed : set[str]|None = None
+        if attribute_type.lower().endswith("enum"):
+            allowed = {str(value.get("id")) for value in attribute.get("tillatte_verdier", [])}
+            attribute_type = attribute_type[:-len("enum")]
+        rules[attribute["id"]] = (attribute.get("navn"), attribute_type, allowed, attribute.get("feltlengde"))
+        if attribute.get("viktighet") == REQUIRED:
+            required.add(attribute["id"])
+    return rules, required
+
+def check_value(value, attribute_type: str, allowed: set[str]|None, max_length: int|None) -> str|None:
+    """The reason value is not valid for the attribute, None if it is."""
+    if isinstance(value, (dict, list)):
+        return None # Structures and geometries are left to the remote validator
+    text : str = str(value).lower() if isinstance(value, bool) else str(value)
+    if allowed is not None:
+        return None if text in allowed else f"'{text}' is not one of the allowed enum ids"
+    pattern : re.Pattern|None = VALUE_PATTERNS.get(attribute_type)
+    if pattern is not None and not pattern.match(text):
+        return f"'{text}' is not a valid {attribute_type}"
+    if attribute_type == "Tekst" and max_length and len(text) > max_length:
+        return f"text is longer than {max_length} characters"
+    return None
+
+def validate_changeset(changeset: dict|str|Changeset, base_url: str = PROD_BASE_URL) -> list[dict]:
+    """Check a changeset against the cached data catalogue before sending it to the write API.
+
+    changeset is a changeset document, a path to one, or a Changeset from changeset.py. Checks the
+    datakatalogversjon, feature type and egenskapstype ids, value types, enum ids, required attributes
+    and duplicate nvdbId/versjon (or tempId for registrer). Returns the errors found, one dict per error
+    with the changeset kind and the index of the object in its vegobjekter. An empty list means the changeset is clean.
+    """
+    if isinstance(changeset, str):
+        with open(changeset, "r", encoding="utf-8") as fp:
+            changeset = json.load(fp)
+    elif isinstance(changeset, Changeset):
+        changeset = {changeset.changeset_key(): {"vegobjekter": changeset.objects}, "datakatalogversjon": changeset.data_catalogue_version}
+    errors : list[dict] = []
+    key : str|None = None
+
+    def error(message: str, index: int|None = None, obj: dict|None = None, attribute_id: int|None = None) -> None:
+        errors.append({"changeset": key, "index": index, "typeId": (obj or {}).get("typeId"), "nvdbId": (obj or {}).get("nvdbId"), "egenskap": attribute_id, "message": message})
+
+    version : str|None = get_version(base_url)
+    if version is None:
+        error("Data catalogue is neither cached nor reachable, cannot validate offline.")
+        return errors
+    if str(changeset.get("datakatalogversjon")) != version:
+        error(f"datakatalogversjon {changeset.get('datakatalogversjon')} does not match the current data catalogue {version}.")
+    keys : list[str] = [key for key in changeset if key != "datakatalogversjon"]
+    unknown : list[str] = [key for key in keys if key not in CHANGESET_KEYS]
+    if unknown:
+        error(f"Unknown changeset kinds: {unknown}. Expected one of: {sorted(CHANGESET_KEYS)}.")
+
+    catalogue : dict[int, dict] = get_catalogue(base_url)
+    rules_by_type : dict[int, tuple[dict[int, tuple], set[int]]] = {}
+    for key in keys:
+        if key not in CHANGESET_KEYS:
+            continue
+        seen : set = set()
+        for index, obj in enumerate(changeset[key].get("vegobjekter", [])):
+            type_id = obj.get("typeId")
+            if type_id not in catalogue:
+                error(f"Unknown feature type {type_id}.", index, obj)
+                continue
+            if key == "registrer":
+                identity = obj.get("tempId")
+            else:
+                if not isinstance(obj.get("nvdbId"), int) or not isinstance(obj.get("versjon"), int):
+                    error("nvdbId and versjon must be integers.", index, obj)
+                identity = obj.get("nvdbId") if key in UNIQUE_NVDB_ID_KEYS else (obj.get("nvdbId"), obj.get("versjon"))
+            if identity is not None:
+                if identity in seen:
+                    error(f"Found a duplicate of tempId {identity} in the changeset." if key == "registrer" else f"Found a duplicate of {obj.get('nvdbId')}-{obj.get('versjon')} in the changeset.", index, obj)
+                seen.add(identity)
+
+            if "egenskaper" not in obj and key != "registrer":
+                continue
+            if type_id not in rules_by_type:
+                rules_by_type[type_id] = attribute_rules(catalogue[type_id])
+            rules, required = rules_by_type[type_id]
+            present : set[int] = set()
+            for attribute in obj.get("egenskaper", []):
+                attribute_id = attribute.get("typeId")
+                if attribute_id not in rules:
+                    error(f"Feature type {type_id} has no egenskapstype {attribute_id}.", index, obj, attribute_id)
+                    continue
+                if str(attribute.get("operasjon", "")).lower() == "slett":
+                    continue
+                present.add(attribute_id)
+                name, attribute_type, allowed, max_length = rules[attribute_id]
+                values = attribute.get("verdi", [])
+                for value in values if isinstance(values, list) else [values]:
+                    reason : str|None = check_value(value, attribute_type, allowed, max_length)
+                    if reason is not None:
+                        error(f"{attribute_id}.{name}: {reason}.", index, obj, attribute_id)
+            if key == "registrer": # New objects must have every required attribute, changes to existing ones may leave them out
+                for attribute_id in required - present:
+                    error(f"Required egenskapstype {attribute_id}.{rules[attribute_id][0]} is missing.", index, obj, attribute_id)
+    return errors
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import threading
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from .compact_frame import LAYOUT_KEY, expand_frame, is_compact
+
+MANIFEST_FILE : str = "manifest.json"
+
+def encode_nested_columns(df: pd.DataFrame) -> tuple[pd.DataFrame, list[str]]:
+    """JSON encode columns holding lists or dicts, so the chunk can be stored as flat columns."""
+    json_columns : list[str] = [col for col in df.columns if df[col].dtype == object and df[col].map(lambda value: isinstance(value, (list, dict))).any()]
+    if not json_columns:
+        return df, []
+    df = df.copy()
+    for col in json_columns:
+        df[col] = df[col].map(lambda value: json.dumps(value, ensure_ascii=False) if isinstance(value, (list, dict)) else None)
+    return df, json_columns
+
+def decode_nested_columns(df: pd.DataFrame, json_columns: list[str]) -> pd.DataFrame:
+    for col in json_columns:
+        if col in df.columns:
+            df[col] = df[col].map(lambda value: json.loads(value) if isinstance(value, str) else None)
+    return df
+
+class ChunkWriter:
+    """Writes a DataFrame chunk by chunk to a directory of part files.
+
+    Each chunk is written as its own file (parquet or csv), and a manifest listing the chunks,
+    their row counts and columns is rewritten after every chunk. The manifest also holds the
+    download checkpoint, so a chunk and the cursor after it are always saved together.
+    Safe to share between threads.
+    """
+    def __init__(self, path: str, file_type: str = "parquet", fingerprint: str = "") -> None:
+        match file_type.lower():
+            case 'parquet':
+                self.file_type = 'parquet'
+            case 'csv':
+                self.file_type = 'csv'
+            case _:
+                print("Unsupported chunk file type. Supported types are: parquet, csv. Defaulting to parquet.")
+                self.file_type = 'parquet'
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(os.path.join(path, MANIFEST_FILE)):
+            for chunk in read_manifest(path)["chunks"]: # Chunks from an earlier download would otherwise be mixed with the new ones
+                if os.path.exists(os.path.join(path, chunk["file"])):
+                    os.remove(os.path.join(path, chunk["file"]))
+        self.manifest : dict = {"file_type": self.file_type, "chunks": [], "checkpoint": {"fingerprint": fingerprint, "shards": {}}}
+        self.save_manifest()
+
+    def save_manifest(self) -> None:
+        temporary_path : str = os.path.join(self.path, MANIFEST_FILE + ".tmp")
+        with open(temporary_path, "w", encoding="utf-8") as fp:
+            json.dump(self.manifest, fp, ensure_ascii=False)
+        os.replace(temporary_path, os.path.join(self.path, MANIFEST_FILE))
+
+    def write_file(self, df: pd.DataFrame, file_name: str) -> dict:
+        df, json_columns = encode_nested_columns(df)
+        file_path : str = os.path.join(self.path, file_name)
+        match self.file_type:
+            case 'parquet':
+                df.to_parquet(file_path, index=False)
+            case 'csv':
+                df.to_csv(file_path, index=False, sep=';', encoding='utf-8')
+        chunk : dict = {"file": file_name, "rows": len(df), "columns": df.columns.tolist(), "json_columns": json_columns}
+        if is_compact(df):
+            chunk["layout"] = df.attrs[LAYOUT_KEY] # Read back as a compact frame, see read_chunk
+        return chunk
+
+    def write(self, df: pd.DataFrame, shard: str|None = None, checkpoint: dict|None = None) -> str:
+        with self.lock:
+            file_name : str = f"part-{len(self.manifest['chunks']):05d}.{self.file_type}"
+            self.manifest["chunks"].append(self.write_file(df, file_name))
+            if shard is not None and checkpoint is not None:
+                self.manifest.setdefault("checkpoint", {"fingerprint": "", "shards": {}})["shards"][shard] = checkpoint
+            self.save_manifest()
+            return file_name
+
+    def save_checkpoint(self, shard: str, checkpoint: dict) -> None:
+        with self.lock:
+            self.manifest.setdefault("checkpoint", {"fingerprint": "", "shards": {}})["shards"][shard] = checkpoint
+            self.save_manifest()
+
+    def get_checkpoint(self, shard: str) -> dict|None:
+        with self.lock:
+            return self.manifest.get("checkpoint", {}).get("shards", {}).get(shard)
+
+    def rewrite(self, chunk_number: int, df: pd.DataFrame) -> None:
+        with self.lock:
+            self.manifest["chunks"][chunk_number] = self.write_file(df, self.manifest["chunks"][chunk_number]["file"])
+            self.save_manifest()
+
+    @classmethod
+    def open(cls, path: str) -> "ChunkWriter":
+        """Open an existing chunk directory, keeping the chunks already written."""
+        manifest : dict = read_manifest(path)
+        writer = cls.__new__(cls)
+        writer.path = path
+        writer.file_type = manifest["file_type"]
+        writer.lock = threading.Lock()
+        writer.manifest = manifest
+        return writer
+
+    @classmethod
+    def resume(cls, path: str, file_type: str = "parquet", fingerprint: str = "") -> "ChunkWriter":
+        """Open path for writing, keeping its chunks and checkpoint only if they belong to the same query.
+
+        A missing manifest or a checkpoint with another fingerprint starts a new download.
+        """
+        if os.path.exists(os.path.join(path, MANIFEST_FILE)):
+            manifest : dict = read_manifest(path)
+            if fingerprint and manifest.get("checkpoint", {}).get("fingerprint") == fingerprint and manifest["file_type"] == file_type.lower():
+                return cls.open(path)
+            print("Checkpoint does not match the query, starting a new download.")
+        return cls(path, file_type, fingerprint)
+
+def read_manifest(path: str) -> dict:
+    with open(os.path.join(path, MANIFEST_FILE), "r", encoding="utf-8") as fp:
+        return json.load(fp)
+
+def read_chunk(path: str, chunk: dict, file_type: str) -> pd.DataFrame:
+    file_path : str = os.path.join(path, chunk["file"])
+    match file_type:
+        case 'parquet' if chunk.get("layout"):
+            # Compact chunks keep their list columns as Arrow lists, the dictionaries become categoricals as usual.
+            df = pq.read_table(file_path).to_pandas(types_mapper=lambda arrow_type: pd.ArrowDtype(arrow_type) if pa.types.is_list(arrow_type) else None)
+            df.attrs[LAYOUT_KEY] = chunk["layout"]
+        case 'parquet':
+            df = pd.read_parquet(file_path)
+        case _:
+            df = pd.read_csv(file_path, sep=';', encoding='utf-8', low_memory=False)
+    return decode_nested_columns(df, chunk.get("json_columns", []))
+
+def read_chunk_columns(path: str, columns: list[str]):
+    """Yield only the given columns of each chunk, as far as the chunk has them."""
+    manifest : dict = read_manifest(path)
+    for chunk in manifest["chunks"]:
+        chunk_columns : list[str] = [col for col in columns if col in chunk["columns"]]
+        if not chunk_columns:
+            continue
+        file_path : str = os.path.join(path, chunk["file"])
+        match manifest["file_type"]:
+            case 'parquet':
+                yield pd.read_parquet(file_path, columns=chunk_columns)
+            case _:
+                yield pd.read_csv(file_path, sep=';', encoding='utf-8', usecols=chunk_columns)
+
+def iter_chunks(path: str):
+    """Yield the chunks of a chunk directory as DataFrames, one at a time."""
+    manifest : dict = read_manifest(path)
+    for chunk in manifest["chunks"]:
+        yield read_chunk(path, chunk, manifest["file_type"])
+
+def chunk_columns(path: str) -> list[str]:
+    """Union of the columns of all chunks, in order of first appearance."""
+    columns : dict = {}
+    for chunk in read_manifest(path)["chunks"]:
+        columns.update(dict.fromkeys(chunk["columns"]))
+    return list(columns)
+
+def export_chunks(path: str, file_name: str, file_type: str = "csv") -> None:
+    """Export all chunks to one file, with only one chunk in memory at a time for csv and txt."""
+    match file_type.lower():
+        case 'csv' | 'txt':
+            extension : str = file_type.lower()
+        case 'excel' | 'xlsx':
+            print("Excel export needs the whole dataset in memory, consider csv or txt for large downloads.")
+            pd.concat((expand_frame(df) if is_compact(df) else df for df in iter_chunks(path)), ignore_index=True).to_excel(file_name+'.xlsx', index=False)
+            return
+        case _:
+            print("Unsupported file type. Supported types are: csv, txt, excel/xlsx, parquet, geoparquet, arrow, gpkg. Defaulting to csv.")
+            extension = 'csv'
+    columns : list[str] = chunk_columns(path)
+    with open(file_name+'.'+extension, "w", encoding="utf-8-sig", newline="") as fp:
+        for chunk_number, df in enumerate(iter_chunks(path)):
+            df = expand_frame(df) if is_compact(df) else df
+            df.reindex(columns=columns).to_csv(fp, index=False, sep=';', header=chunk_number == 0)
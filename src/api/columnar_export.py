@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+
+import json
+import geopandas as gpd
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shapely
+from pyproj import CRS
+from .chunked_storage import encode_nested_columns
+
+COLUMNAR_FILE_TYPES : dict[str, str] = {
+    'parquet': 'parquet',
+    'geoparquet': 'parquet',
+    'arrow': 'arrow',
+    'ipc': 'arrow',
+    'feather': 'arrow',
+    'gpkg': 'gpkg',
+    'geopackage': 'gpkg',
+}
+# Geometry columns as WKT, and the column holding their SRID. Populated feature types, raw feature types and road segments.
+GEOMETRY_COLUMNS : list[tuple[str, str]] = [
+    ('Geometri', 'Geometri_SRID'),
+    ('Lokasjonsgeometri', 'Geometri_SRID'),
+    ('geometri.wkt', 'geometri.srid'),
+    ('lokasjon.geometri.wkt', 'geometri.srid'),
+]
+
+def geometry_columns(columns: list[str]) -> list[tuple[str, str]]:
+    return [(geometry_column, srid_column) for geometry_column, srid_column in GEOMETRY_COLUMNS if geometry_column in columns]
+
+def most_common_srid(df: pd.DataFrame, srid_column: str) -> int|None:
+    if srid_column not in df.columns or df[srid_column].dropna().empty:
+        return None
+    srids = df[srid_column].dropna().astype(int).value_counts()
+    if len(srids) > 1:
+        print(f"Several SRIDs in {srid_column}: {srids.index.tolist()}, using {srids.index[0]}.")
+    return int(srids.index[0])
+
+def is_nested(value) -> bool:
+    return isinstance(value, dict) or (isinstance(value, list) and any(isinstance(item, (list, dict)) for item in value))
+
+def as_text(values) -> pa.Array:
+    return pa.array([json.dumps(value, ensure_ascii=False, default=str) if isinstance(value, (list, dict)) else (None if value is None or value != value else str(value)) for value in values], type=pa.string())
+
+def arrow_column(values: pd.Series) -> pa.Array:
+    """Convert a column to Arrow, keeping lists of scalars as Arrow lists.
+
+    Raw JSON objects (dicts and lists of dicts) are stored as JSON text, since their structure varies between rows.
+    Columns Arrow cannot type otherwise (mixed types) are stored as text.
+    """
+    if values.dtype == object and values.map(is_nested).any():
+        return as_text(values)
+    try:
+        return pa.array(values, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        return as_text(values)
+
+def to_arrow_table(df: pd.DataFrame, wkb_columns: list[str]|None = None) -> pa.Table:
+    """Convert df to an Arrow table. WKT columns in wkb_columns are converted to WKB for GeoParquet."""
+    arrays : dict[str, pa.Array] = {}
+    for col in df.columns:
+        if wkb_columns and col in wkb_columns:
+            geometries = shapely.from_wkt(df[col].where(df[col].notna(), None).to_numpy(dtype=object), on_invalid='ignore')
+            arrays[col] = pa.array(shapely.to_wkb(geometries, include_srid=False), type=pa.binary())
+        else:
+            arrays[col] = arrow_column(df[col])
+    return pa.table(arrays)
+
+def unify_schemas(schemas: list[pa.Schema]) -> pa.Schema:
+    """Union of the fields of all schemas in order of appearance. Fields with incompatible types become text."""
+    field_types : dict[str, list[pa.DataType]] = {}
+    for schema in schemas:
+        for field in schema:
+            field_types.setdefault(field.name, []).append(field.type)
+    fields : list[pa.Field] = []
+    for name, types in field_types.items():
+        try:
+            fields.append(pa.unify_schemas([pa.schema([pa.field(name, field_type)]) for field_type in types], promote_options='permissive').field(name))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            fields.append(pa.field(name, pa.string()))
+    return pa.schema(fields)
+
+def conform_table(table: pa.Table, schema: pa.Schema) -> pa.Table:
+    """Add missing columns as nulls and cast table to schema, so every chunk shares the same schema."""
+    arrays : list[pa.Array] = []
+    for field in schema:
+        if field.name not in table.column_names:
+            arrays.append(pa.nulls(len(table), type=field.type))
+            continue
+        column = table.column(field.name)
+        if column.type != field.type:
+            if pa.types.is_string(field.type) and not pa.types.is_string(column.type):
+                column = as_text(column.to_pylist())
+            else:
+                column = column.cast(field.type)
+        arrays.append(column)
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+def geo_metadata(wkb_columns: list[str], srid: int|None) -> bytes:
+    """GeoParquet 1.0 file metadata for WKB geometry columns, with the CRS as PROJJSON."""
+    crs = None
+    if srid is not None:
+        crs = CRS.from_epsg(srid).to_json_dict()
+    return json.dumps({
+        "version": "1.0.0",
+        "primary_column": wkb_columns[0],
+        "columns": {col: {"encoding": "WKB", "geometry_types": [], "crs": crs} for col in wkb_columns}
+    }).encode("utf-8")
+
+def export_columnar_chunks(chunks, file_name: str, file_type: str, row_group_size: int|None = None) -> str:
+    """Write the DataFrames produced by chunks() to one columnar file, one chunk in memory at a time.
+
+    chunks is a callable returning a fresh iterator over the chunks, it is iterated twice: once to build
+    a common schema and once to write. Parquet files get one or more row groups per chunk and Arrow IPC
+    files one record batch per chunk. GeoParquet and GeoPackage store the WKT geometry columns as real
+    geometries in the CRS of the SRID column. Returns the path written.
+    """
+    file_type = file_type.lower()
+    extension : str = COLUMNAR_FILE_TYPES[file_type]
+    path : str = f"{file_name}.{extension}"
+
+    schemas : list[pa.Schema] = []
+    columns : dict = {}
+    srid : int|None = None
+    wkb_columns : list[str] = []
+    for df in chunks():
+        columns.update(dict.fromkeys(df.columns))
+        found : list[tuple[str, str]] = geometry_columns(df.columns.tolist())
+        wkb_columns = list(dict.fromkeys(wkb_columns + [geometry_column for geometry_column, _ in found]))
+        if srid is None and found:
+            srid = most_common_srid(df, found[0][1])
+        if extension != 'gpkg':
+            schemas.append(to_arrow_table(df, wkb_columns if file_type == 'geoparquet' else None).schema)
+
+    match extension:
+        case 'gpkg':
+            if not wkb_columns:
+                print("No geometry column found, GeoPackage needs one of: " + ", ".join(col for col, _ in GEOMETRY_COLUMNS))
+                return path
+            for chunk_number, df in enumerate(chunks()):
+                # GeoPackage holds one geometry column, any other geometry columns are kept as WKT text and lists as JSON.
+                df, _ = encode_nested_columns(df.reindex(columns=list(columns)))
+                geometry = gpd.GeoSeries.from_wkt(df[wkb_columns[0]].where(df[wkb_columns[0]].notna(), None), crs=f"EPSG:{srid}" if srid else None, on_invalid='ignore')
+                gdf = gpd.GeoDataFrame(df.drop(columns=[wkb_columns[0]]), geometry=geometry.rename(wkb_columns[0]))
+                gdf.to_file(path, driver='GPKG', mode='w' if chunk_number == 0 else 'a')
+        case 'parquet':
+            schema : pa.Schema = unify_schemas(schemas)
+            if file_type == 'geoparquet' and wkb_columns:
+                schema = schema.with_metadata({b"geo": geo_metadata(wkb_columns, srid)})
+            with pq.ParquetWriter(path, schema) as writer:
+                for df in chunks():
+                    writer.write_table(conform_table(to_arrow_table(df, wkb_columns if file_type == 'geoparquet' else None), schema), row_group_size=row_group_size)
+        case 'arrow':
+            schema = unify_schemas(schemas)
+            with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, schema) as writer:
+                for df in chunks():
+                    writer.write_table(conform_table(to_arrow_table(df), schema))
+    return path
+
+def export_columnar(df: pd.DataFrame, file_name: str, file_type: str, row_group_size: int|None = None) -> str:
+    return export_columnar_chunks(lambda: iter([df]), file_name, file_type, row_group_size=row_group_size)
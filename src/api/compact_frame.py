@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+ID_COLUMNS : list[str] = ['nvdbId', 'VT_ID', 'Versjon', 'Geometri_SRID', 'id', 'metadata.versjon', 'veglenkesekvensid']
+# Date columns and the format they are written in by the API, checked against the values before converting.
+DATE_COLUMNS : dict[str, str] = {
+    'Startdato': '%Y-%m-%d',
+    'Sluttdato': '%Y-%m-%d',
+    'Sist_modifisert': '%Y-%m-%dT%H:%M:%S',
+    'metadata.startdato': '%Y-%m-%d',
+    'metadata.sluttdato': '%Y-%m-%d',
+    'metadata.sist_modifisert': '%Y-%m-%dT%H:%M:%S',
+}
+CATEGORY_THRESHOLD : float = 0.5 # Text columns with fewer distinct values than this share of the rows become categoricals
+LAYOUT_KEY : str = 'expanded_layout' # Key in DataFrame.attrs holding what compact_frame changed, for expand_frame
+
+def memory_usage(df: pd.DataFrame) -> int:
+    """Bytes held by df, including the Python objects in object columns."""
+    return int(df.memory_usage(deep=True).sum())
+
+def is_text(values: pd.Series) -> bool:
+    return pd.api.types.infer_dtype(values, skipna=True) in ('string', 'empty')
+
+def list_column(values: pd.Series) -> pd.Series|None:
+    """A column of lists of scalars as an Arrow list column, text values dictionary encoded. None if the column holds anything else."""
+    first = values.first_valid_index()
+    if first is None or not isinstance(values[first], list):
+        return None
+    try:
+        lists = pa.array(values.tolist(), from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        return None
+    if not pa.types.is_list(lists.type) or pa.types.is_nested(lists.type.value_type):
+        return None
+    if pa.types.is_string(lists.type.value_type) or pa.types.is_null(lists.type.value_type):
+        # Offsets and validity of the lists are kept, the repeated strings become int32 codes into one dictionary.
+        values_array = lists.values.cast(pa.string()).dictionary_encode()
+        lists = pa.ListArray.from_arrays(lists.offsets, values_array, mask=lists.is_null())
+    return pd.Series(pd.arrays.ArrowExtensionArray(lists), index=values.index, name=values.name)
+
+def list_values(values: pd.Series) -> list:
+    """The Python lists of an Arrow list column, None for missing lists."""
+    lists = pa.array(values.array)
+    if isinstance(lists, pa.ChunkedArray):
+        lists = lists.combine_chunks()
+    items = lists.flatten()
+    if pa.types.is_dictionary(items.type):
+        items = np.asarray(items.dictionary.to_pylist() + [None], dtype=object)[items.indices.fill_null(-1).to_numpy(zero_copy_only=False)].tolist()
+    else:
+        items = items.to_pylist()
+    offsets = (lists.offsets.to_numpy() - lists.offsets[0].as_py()).tolist()
+    valid = lists.is_valid().to_numpy(zero_copy_only=False).tolist()
+    return [items[start:end] if is_valid else None for start, end, is_valid in zip(offsets[:-1], offsets[1:], valid)]
+
+def date_column(values: pd.Series, date_format: str) -> pd.Series|None:
+    """A column of date strings as datetime64, if every value parses with date_format and formats back to the same text."""
+    if values.notna().sum() == 0 or not is_text(values):
+        return None
+    text = pa.array(values.astype(object).where(values.notna(), None).tolist(), type=pa.string())
+    dates = pc.strptime(text, format=date_format, unit='s', error_is_null=True)
+    if dates.null_count != text.null_count or not pc.all(pc.equal(pc.strftime(dates, format=date_format), text)).as_py():
+        return None
+    return pd.Series(dates.to_numpy(zero_copy_only=False), index=values.index, name=values.name)
+
+def compact_frame(df: pd.DataFrame, category_threshold: float = CATEGORY_THRESHOLD, report: bool = True) -> pd.DataFrame:
+    """A compact copy of a downloaded frame, e.g. FeatureTypeDownloader.objects after populate_columns.
+
+    Lists of scalars (Kommuner, Vegkategorier, Stedfestinger, Forelder_ ids, ...) become Arrow list columns of
+    offsets and values, ids become int64, the API dates datetime64 and repeated text categoricals. What was
+    changed is kept in df.attrs, so expand_frame can restore the usual layout.
+    """
+    before : int = memory_usage(df)
+    columns : dict[str, pd.Series] = {}
+    layout : dict[str, dict] = {}
+    for col in df.columns:
+        values : pd.Series = df[col]
+        if col in ID_COLUMNS and values.dtype != np.int64:
+            ids = pd.to_numeric(values, errors='coerce')
+            if ids.notna().sum() == values.notna().sum() and (ids.dropna() % 1 == 0).all():
+                columns[col] = ids.astype('int64' if ids.notna().all() else 'Int64')
+                layout[col] = {'kind': 'id', 'dtype': str(values.dtype)}
+                continue
+        if col in DATE_COLUMNS:
+            dates = date_column(values, DATE_COLUMNS[col])
+            if dates is not None:
+                columns[col], layout[col] = dates, {'kind': 'date', 'dtype': str(values.dtype), 'format': DATE_COLUMNS[col]}
+                continue
+        if values.dtype == object:
+            lists = list_column(values)
+            if lists is not None:
+                columns[col], layout[col] = lists, {'kind': 'list', 'dtype': 'object'}
+                continue
+        if (values.dtype == object or pd.api.types.is_string_dtype(values.dtype)) and not isinstance(values.dtype, pd.CategoricalDtype):
+            if values.notna().any() and is_text(values) and values.nunique() < category_threshold * len(values):
+                columns[col], layout[col] = values.astype('category'), {'kind': 'category', 'dtype': str(values.dtype)}
+                continue
+        columns[col] = values
+    compacted = pd.DataFrame(columns, index=df.index)
+    compacted.attrs = {**df.attrs, LAYOUT_KEY: {**df.attrs.get(LAYOUT_KEY, {}), **layout}}
+    if report:
+        after : int = memory_usage(compacted)
+        print(f"Compacted {len(layout)} of {len(df.columns)} columns: {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB ({after / before:.0%}).")
+    return compacted
+
+def is_compact(df: pd.DataFrame) -> bool:
+    return bool(df.attrs.get(LAYOUT_KEY))
+
+def memory_report(before: pd.DataFrame, after: pd.DataFrame) -> pd.DataFrame:
+    """Bytes per column before and after compact_frame, largest savings first, with a total row."""
+    report = pd.DataFrame({
+        'dtype_before': before.dtypes.astype(str),
+        'dtype_after': after.dtypes.astype(str).reindex(before.columns),
+        'bytes_before': before.memory_usage(deep=True, index=False),
+        'bytes_after': after.memory_usage(deep=True, index=False).reindex(before.columns),
+    })
+    report['saved'] = report['bytes_before'] - report['bytes_after']
+    report = report.sort_values('saved', ascending=False)
+    report.loc['Total'] = ['', '', report['bytes_before'].sum(), report['bytes_after'].sum(), report['saved'].sum()]
+    return report
+
+def restore_dtype(values: pd.Series, dtype: str) -> pd.Series:
+    if dtype == 'object':
+        return values.astype(object).where(values.notna(), None)
+    return values.astype(dtype)
+
+def expand_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """The layout from before compact_frame: Python lists, date strings and text or object columns."""
+    layout : dict[str, dict] = df.attrs.get(LAYOUT_KEY, {})
+    columns : dict[str, pd.Series] = {}
+    for col in df.columns:
+        values : pd.Series = df[col]
+        change : dict|None = layout.get(col)
+        if change is None:
+            columns[col] = values
+        elif change['kind'] == 'list':
+            columns[col] = pd.Series(list_values(values), index=df.index, name=col, dtype=object)
+        elif change['kind'] == 'date':
+            # Whole seconds, parquet may have stored them as ms and strftime would print the fraction.
+            text = pc.strftime(pa.array(values.to_numpy(), from_pandas=True).cast(pa.timestamp('s')), format=change['format'])
+            columns[col] = restore_dtype(pd.Series(text.to_pylist(), index=df.index, name=col, dtype=object), change['dtype'])
+        else:
+            columns[col] = restore_dtype(values, change['dtype'])
+    expanded = pd.DataFrame(columns, index=df.index)
+    expanded.attrs = {key: value for key, value in df.attrs.items() if key != LAYOUT_KEY}
+    return expanded
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+import glob
+import json
+import os
+import threading
+from urllib.parse import urlparse
+from .http_session import get_json
+
+CACHE_DIR : str = os.environ.get("NVDB_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "nvdb-skripting"))
+PROD_BASE_URL : str = "https://nvdbapiles.atlas.vegvesen.no/"
+
+_versions : dict[str, str|None] = {}
+_catalogues : dict[tuple[str, str], dict[int, dict]] = {}
+_lock = threading.Lock()
+
+def cache_path(base_url: str, version: str = "*") -> str:
+    # One directory per API host, since test and prod can run different catalogue versions.
+    return os.path.join(CACHE_DIR, urlparse(base_url).netloc, f"datakatalog_{version}.json")
+
+def cached_versions(base_url: str) -> list[str]:
+    """Catalogue versions cached on disk for base_url, newest file last."""
+    files : list[str] = sorted(glob.glob(cache_path(base_url)), key=os.path.getmtime)
+    return [os.path.basename(file)[len("datakatalog_"):-len(".json")] for file in files]
+
+def get_version(base_url: str = PROD_BASE_URL) -> str|None:
+    """The current datakatalogversjon, asked from the API at most once per process.
+
+    Offline, the newest cached version is used. None if there is neither.
+    """
+    with _lock:
+        if base_url not in _versions:
+            data : dict|None = get_json(f"{base_url}datakatalog/api/v1/versjon")
+            version : str|None = str(data.get("versjon")) if data and data.get("versjon") else None
+            if version is None and cached_versions(base_url):
+                version = cached_versions(base_url)[-1]
+                print(f"Could not reach the data catalogue, using cached version {version}.")
+            _versions[base_url] = version
+        return _versions[base_url]
+
+def get_catalogue(base_url: str = PROD_BASE_URL) -> dict[int, dict]:
+    """All feature types of the current data catalogue, with egenskapstyper and relasjonstyper, keyed on type id.
+
+    The catalogue is downloaded in one request the first time a version is seen and cached on disk,
+    so later runs and other types are served from the cache. Empty if it is neither cached nor reachable.
+    """
+    version : str|None = get_version(base_url)
+    if version is None:
+        return {}
+    with _lock:
+        if (base_url, version) in _catalogues:
+            return _catalogues[(base_url, version)]
+        path : str = cache_path(base_url, version)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as fp:
+                feature_types : list[dict] = json.load(fp)
+        else:
+            data = get_json(f"{base_url}datakatalog/api/v1/vegobjekttyper?inkluder=egenskapstyper,relasjonstyper")
+            if not isinstance(data, list):
+                return {}
+            feature_types = data
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + ".tmp", "w", encoding="utf-8") as fp:
+                json.dump(feature_types, fp, ensure_ascii=False)
+            os.replace(path + ".tmp", path)
+        catalogue : dict[int, dict] = {feature_type["id"]: feature_type for feature_type in feature_types if "id" in feature_type}
+        _catalogues[(base_url, version)] = catalogue
+        return catalogue
+
+def get_feature_type(feature_type_id: int, base_url: str = PROD_BASE_URL) -> dict|None:
+    return get_catalogue(base_url).get(int(feature_type_id))
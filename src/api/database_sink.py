@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+
+import json
+import time
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from .compact_frame import LAYOUT_KEY, list_values
+
+try:
+    import pyodbc
+except ImportError: # Also raised when the ODBC driver manager (unixODBC) is missing
+    pyodbc = None
+
+BATCH_SIZE : int = 10_000 # Rows per executemany call
+KEY_COLUMNS : list[list[str]] = [['nvdbId', 'Versjon'], ['id', 'metadata.versjon']] # Populated and raw feature types
+STAGING_TABLE : str = '#nvdb_staging' # SQL Server temporary table the batches are bulk inserted into before the MERGE
+# SQL type of each kind of column, per dialect. Key columns of text get a bounded type, since SQL Server cannot index NVARCHAR(MAX).
+SQL_TYPES : dict[str, dict[str, str]] = {
+    'mssql': {'int': 'BIGINT', 'float': 'FLOAT', 'bool': 'BIT', 'datetime': 'DATETIME2', 'text': 'NVARCHAR(MAX)', 'key': 'NVARCHAR(450)'},
+    'sqlite': {'int': 'INTEGER', 'float': 'REAL', 'bool': 'BOOLEAN', 'datetime': 'DATETIME', 'text': 'TEXT', 'key': 'TEXT'},
+}
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=str)
+
+def is_list_column(values: pd.Series) -> bool:
+    return isinstance(values.dtype, pd.ArrowDtype) and pa.types.is_list(values.dtype.pyarrow_dtype)
+
+def column_kind(values: pd.Series) -> str:
+    """Which SQL column type a column needs: int, float, bool, datetime or text (lists and dicts as JSON text)."""
+    if is_list_column(values):
+        return 'text'
+    if pd.api.types.is_bool_dtype(values.dtype):
+        return 'bool'
+    if pd.api.types.is_integer_dtype(values.dtype):
+        return 'int'
+    if pd.api.types.is_float_dtype(values.dtype):
+        return 'float'
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        return 'datetime'
+    match pd.api.types.infer_dtype(values, skipna=True):
+        case 'boolean':
+            return 'bool'
+        case 'integer':
+            return 'int'
+        case 'floating' | 'mixed-integer-float':
+            return 'float'
+        case 'datetime' | 'datetime64':
+            return 'datetime'
+        case _:
+            return 'text'
+
+def kind_of_sql_type(sql_type: str) -> str:
+    """The column kind of an existing column, from the type name the database reports."""
+    sql_type = sql_type.lower()
+    if sql_type.startswith('bit') or sql_type.startswith('bool'):
+        return 'bool'
+    if 'int' in sql_type:
+        return 'int'
+    if any(name in sql_type for name in ('float', 'real', 'double', 'decimal', 'numeric')):
+        return 'float'
+    if 'date' in sql_type or 'time' in sql_type:
+        return 'datetime'
+    return 'text'
+
+def as_text(value) -> str|None:
+    if value is None:
+        return None
+    if isinstance(value, (list, dict)):
+        return _encoder.encode(value)
+    if isinstance(value, (float, np.floating)) and value != value:
+        return None
+    return str(value)
+
+def text_values(values: list) -> list[str|None]:
+    """as_text of every value, encoding each distinct list once. Most list columns repeat a few values, e.g. Kommuner."""
+    try:
+        codes, uniques = pd.factorize(pd.Series([tuple(value) if isinstance(value, list) else value for value in values], dtype=object))
+    except TypeError: # Dicts or nested lists
+        return [as_text(value) for value in values]
+    texts : list[str|None] = [as_text(list(value) if isinstance(value, tuple) else value) for value in uniques] + [None]
+    return [texts[code] for code in codes.tolist()]
+
+def column_values(values: pd.Series, kind: str, dialect: str, date_format: str|None = None) -> list:
+    """The values of a column as Python objects of the given kind, None for missing values. Raises ValueError if they do not fit.
+
+    date_format is the text layout of a compact frame's date column (see compact_frame), used when the table column is text.
+    """
+    if is_list_column(values):
+        return text_values(list_values(values)) # Compact frame list column, see compact_frame
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype(object)
+    match kind:
+        case 'int' | 'float' | 'bool':
+            numbers = pd.to_numeric(values, errors='coerce')
+            if numbers.notna().sum() != values.notna().sum():
+                raise ValueError(f"Column {values.name} holds values that are not numbers, but the table column is {kind}.")
+            if kind == 'int' or kind == 'bool':
+                if ((numbers.dropna() % 1) != 0).any():
+                    raise ValueError(f"Column {values.name} holds decimals, but the table column is {kind}.")
+                numbers = numbers.astype('Int64')
+            numbers = numbers.astype(object).where(numbers.notna(), None)
+            return [bool(number) if number is not None else None for number in numbers] if kind == 'bool' and dialect == 'mssql' else numbers.tolist()
+        case 'datetime':
+            dates = pd.to_datetime(values, errors='coerce')
+            if dialect == 'sqlite': # sqlite3 has no datetime type, ISO 8601 text sorts and compares correctly
+                return dates.dt.strftime('%Y-%m-%dT%H:%M:%S').astype(object).where(dates.notna(), None).tolist()
+            return dates.astype(object).where(dates.notna(), None).map(lambda date: date.to_pydatetime() if date is not None else None).tolist()
+        case _:
+            if date_format and pd.api.types.is_datetime64_any_dtype(values.dtype):
+                return values.dt.strftime(date_format).astype(object).where(values.notna(), None).tolist()
+            return text_values(values.astype(object).tolist())
+
+class DatabaseSink:
+    """Writes downloaded frames to a database table through pyodbc, in batches and as upserts on the key columns.
+
+    The table is created from the columns of the first frame written (e.g. the populate_columns layout) with the
+    key columns as primary key, and columns first seen in later frames are added. Rows whose key is already in the
+    table are updated, so downloading again and writing to the same table keeps one row per object version.
+    Lists and dicts are stored as JSON text.
+
+    SQL Server gets fast_executemany bulk inserts into a temporary staging table and one MERGE per frame.
+    SQLite, through its ODBC driver or a sqlite3 connection, gets INSERT ... ON CONFLICT DO UPDATE.
+
+    Example:
+        with DatabaseSink("DRIVER={ODBC Driver 18 for SQL Server};SERVER=...;DATABASE=nvdb;Trusted_Connection=yes") as sink:
+            sink.write(feature_type.objects, "vegobjekter_487")
+    """
+    def __init__(self, connection_string: str|None = None, connection=None, dialect: str|None = None, schema: str|None = None, batch_size: int = BATCH_SIZE) -> None:
+        if connection is None:
+            if pyodbc is None:
+                raise ImportError("pyodbc is not available, install it and an ODBC driver manager (unixODBC on Linux) to write to a database.")
+            connection = pyodbc.connect(connection_string, autocommit=False)
+        self.connection = connection
+        self.dialect : str = dialect or detect_dialect(connection)
+        if self.dialect not in SQL_TYPES:
+            raise ValueError(f"Unsupported dialect '{self.dialect}'. Supported dialects are: {list(SQL_TYPES)}.")
+        self.schema : str|None = schema
+        self.batch_size : int = batch_size
+        self.tables : dict[str, dict[str, str]] = {} # Column kinds of the tables written to, by table name
+
+    def __enter__(self) -> "DatabaseSink":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def quote(self, name: str) -> str:
+        if self.dialect == 'mssql':
+            return "[" + name.replace("]", "]]") + "]"
+        return '"' + name.replace('"', '""') + '"'
+
+    def table_name(self, table: str) -> str:
+        return f"{self.quote(self.schema)}.{self.quote(table)}" if self.schema else self.quote(table)
+
+    def existing_columns(self, cursor, table: str) -> dict[str, str]:
+        """Column kinds of table as it is in the database, empty if it does not exist."""
+        match self.dialect:
+            case 'mssql':
+                cursor.execute("SELECT COLUMN_NAME, DATA_TYPE FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = ? AND TABLE_SCHEMA = COALESCE(?, SCHEMA_NAME()) ORDER BY ORDINAL_POSITION", table, self.schema)
+                rows = cursor.fetchall()
+            case _:
+                schema : str = f"{self.quote(self.schema)}." if self.schema else ""
+                rows = [(row[1], row[2]) for row in cursor.execute(f"PRAGMA {schema}table_info({self.quote(table)})").fetchall()]
+        return {name: kind_of_sql_type(sql_type) for name, sql_type in rows}
+
+    def ensure_table(self, cursor, table: str, df: pd.DataFrame, key_columns: list[str]) -> dict[str, str]:
+        """Create table from the columns of df, or add the columns of df it lacks. Returns the kinds of all its columns."""
+        if table not in self.tables:
+            self.tables[table] = self.existing_columns(cursor, table)
+        columns : dict[str, str] = self.tables[table]
+        types : dict[str, str] = SQL_TYPES[self.dialect]
+        def definition(col: str, kind: str) -> str:
+            sql_type : str = types['key'] if col in key_columns and kind == 'text' else types[kind]
+            return f"{self.quote(col)} {sql_type}" + (" NOT NULL" if col in key_columns else "")
+
+        new_columns : dict[str, str] = {col: column_kind(df[col]) for col in df.columns if col not in columns}
+        if not columns:
+            definitions : list[str] = [definition(col, kind) for col, kind in new_columns.items()]
+            definitions.append(f"PRIMARY KEY ({', '.join(self.quote(col) for col in key_columns)})")
+            cursor.execute(f"CREATE TABLE {self.table_name(table)} ({', '.join(definitions)})")
+        else:
+            for col, kind in new_columns.items():
+                cursor.execute(f"ALTER TABLE {self.table_name(table)} ADD {definition(col, kind).removesuffix(' NOT NULL')}")
+        columns.update(new_columns)
+        return columns
+
+    def upsert(self, cursor, table: str, columns: list[str], key_columns: list[str], rows: list[tuple], kinds: list[str]) -> None:
+        quoted : list[str] = [self.quote(col) for col in columns]
+        values : list[str] = [col for col in columns if col not in key_columns]
+        batches = range(0, len(rows), self.batch_size)
+        match self.dialect:
+            case 'mssql':
+                # Bulk insert into a staging table with the target's column types, then one set based MERGE.
+                cursor.execute(f"DROP TABLE IF EXISTS {self.quote(STAGING_TABLE)}")
+                cursor.execute(f"SELECT TOP 0 {', '.join(quoted)} INTO {self.quote(STAGING_TABLE)} FROM {self.table_name(table)}")
+                cursor.fast_executemany = True
+                # Without input sizes, fast_executemany allocates NVARCHAR(MAX) parameters at their largest possible size.
+                cursor.setinputsizes([(pyodbc.SQL_WVARCHAR, 0, 0) if kind == 'text' else None for kind in kinds])
+                insert : str = f"INSERT INTO {self.quote(STAGING_TABLE)} ({', '.join(quoted)}) VALUES ({', '.join('?' * len(columns))})"
+                for start in batches:
+                    cursor.executemany(insert, rows[start:start + self.batch_size])
+                matched : str = f"WHEN MATCHED THEN UPDATE SET {', '.join(f'target.{self.quote(col)} = source.{self.quote(col)}' for col in values)} " if values else ""
+                cursor.execute(
+                    f"MERGE {self.table_name(table)} WITH (HOLDLOCK) AS target USING {self.quote(STAGING_TABLE)} AS source "
+                    f"ON {' AND '.join(f'target.{self.quote(col)} = source.{self.quote(col)}' for col in key_columns)} "
+                    f"{matched}WHEN NOT MATCHED THEN INSERT ({', '.join(quoted)}) VALUES ({', '.join(f'source.{col}' for col in quoted)});"
+                )
+                cursor.execute(f"DROP TABLE {self.quote(STAGING_TABLE)}")
+            case _:
+                update : str = f"DO UPDATE SET {', '.join(f'{self.quote(col)} = excluded.{self.quote(col)}' for col in values)}" if values else "DO NOTHING"
+                insert : str = (
+                    f"INSERT INTO {self.table_name(table)} ({', '.join(quoted)}) VALUES ({', '.join('?' * len(columns))}) "
+                    f"ON CONFLICT ({', '.join(self.quote(col) for col in key_columns)}) {update}"
+                )
+                for start in batches:
+                    cursor.executemany(insert, rows[start:start + self.batch_size])
+
+    def write(self, df: pd.DataFrame, table: str, key_columns: list[str]|None = None) -> int:
+        """Upsert the rows of df into table, creating or extending it first. Returns the number of rows written.
+
+        key_columns defaults to nvdbId and Versjon (id and metadata.versjon for unpopulated frames). Within df the
+        last row of each key wins. Rows with a missing numeric key are left out, missing text keys are stored as ''.
+        """
+        if df.empty:
+            return 0
+        key_columns = key_columns or find_key_columns(df)
+        df = df.drop_duplicates(subset=key_columns, keep='last')
+        text_keys : list[str] = [col for col in key_columns if column_kind(df[col]) == 'text']
+        if text_keys:
+            df = df.assign(**{col: df[col].astype(object).where(df[col].notna(), '') for col in text_keys})
+        missing_key = df[key_columns].isna().any(axis=1)
+        if missing_key.any():
+            print(f"Leaving out {int(missing_key.sum())} rows without {key_columns}.")
+            df = df[~missing_key]
+
+        cursor = self.connection.cursor()
+        try:
+            kinds : dict[str, str] = self.ensure_table(cursor, table, df, key_columns)
+            columns : list[str] = list(df.columns)
+            layout : dict[str, dict] = df.attrs.get(LAYOUT_KEY, {})
+            rows : list[tuple] = list(zip(*(column_values(df[col], kinds[col], self.dialect, layout.get(col, {}).get('format')) for col in columns)))
+            self.upsert(cursor, table, columns, key_columns, rows, [kinds[col] for col in columns])
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            # On SQL Server the CREATE or ALTER TABLE is rolled back too, so the cached columns are read again next time.
+            self.tables.pop(table, None)
+            raise
+        finally:
+            cursor.close()
+        return len(rows)
+
+    def write_chunks(self, chunks, table: str, key_columns: list[str]|None = None) -> int:
+        """Write an iterable of frames, e.g. iter_chunks of a streamed download, one chunk and one commit at a time."""
+        start_time : float = time.perf_counter()
+        total : int = 0
+        for chunk_number, chunk in enumerate(chunks):
+            total += self.write(chunk, table, key_columns)
+            print(f"Chunk {chunk_number}: {total} rows written to {table} in {time.perf_counter() - start_time:.1f} seconds.")
+        return total
+
+def detect_dialect(connection) -> str:
+    """mssql or sqlite, from the DBMS a pyodbc connection reports, or sqlite for a sqlite3 connection."""
+    if type(connection).__module__.startswith('sqlite3'):
+        return 'sqlite'
+    if pyodbc is not None and isinstance(connection, pyodbc.Connection):
+        dbms_name : str = connection.getinfo(pyodbc.SQL_DBMS_NAME).lower()
+        if 'sql server' in dbms_name:
+            return 'mssql'
+        if 'sqlite' in dbms_name:
+            return 'sqlite'
+        raise ValueError(f"Unsupported database '{dbms_name}', pass dialect='mssql' or 'sqlite' if it understands one of them.")
+    raise ValueError("Could not tell the database of the connection, pass dialect='mssql' or 'sqlite'.")
+
+def find_key_columns(df: pd.DataFrame) -> list[str]:
+    key_columns : list[str]|None = next((keys for keys in KEY_COLUMNS if all(col in df.columns for col in keys)), None)
+    if key_columns is None:
+        raise KeyError(f"Found no key columns in the frame, expected one of: {KEY_COLUMNS}. Pass key_columns.")
+    return key_columns
@@ -1,28 +1,37 @@
 # -*- coding: utf-8 -*-
 
-import requests
+import hashlib
+import json
+import queue
+import threading
 import time
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from functools import wraps
+from .compact_frame import compact_frame, expand_frame, is_compact
+from .columnar_export import COLUMNAR_FILE_TYPES, export_columnar, export_columnar_chunks
+from .chunked_storage import ChunkWriter, export_chunks, iter_chunks, read_chunk_columns
+from .data_catalogue import get_feature_type
+from .database_sink import DatabaseSink
+from .feature_store import drop_closed_versions, last_modified, load_store, save_store, sort_objects, upsert_objects
+from .http_session import get_json
+from .page_decoder import decode_objects
+from .query import Query
+
+COUNTIES : list[str] = ['3', '11', '15', '18', '31', '32', '33', '34', '39', '40', '42', '46', '50', '55', '56']
+ROAD_CATEGORIES : list[str] = ['E', 'R', 'F', 'K', 'P', 'S']
+LOCATION_COLUMNS : list[str] = ['lokasjon.kontraktsområder', 'lokasjon.vegforvaltere', 'lokasjon.adresser', 'lokasjon.vegsystemreferanser', 'lokasjon.stedfestinger', 'lokasjon.riksvegruter']
+ROAD_REFERENCE_CHUNK_SIZE : int = 50000
+GEOMETRY_QUALITY_PARAMETERS : list[str] = ['Målemetode', 'Datafangstmetode', 'Nøyaktighet', 'Synbarhet', 'MålemetodeHøyde', 'DatafangstmetodeHøyde', 'NøyaktighetHøyde']
 
 def api_caller(api_url):
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
-            MAX_RETRIES = 3
-            retries = 0
-            while retries < MAX_RETRIES:
-                response = requests.get(api_url, headers={"X-Client": "Andryg python"})
-                if response.status_code == 200:
-                    data = response.json()
-                    return func(data)
-                else:
-                    print(response.text)
-                    print("Error, retrying in 5 seconds")
-                    retries += 1
-                    time.sleep(5)
-            print("Max retries reached. Exiting.")
-            return None
+            data = get_json(api_url)
+            if data is None:
+                return None
+            return func(data)
         return wrapper
     return decorator
 
@@ -36,8 +45,279 @@ def timing_decorator(func):
         return result
     return wrapper
 
+def index_attributes(attributes) -> dict|None:
+    """Index a row's egenskaper on id (as str), keeping the first attribute for each id."""
+    if not isinstance(attributes, list):
+        return None
+    indexed : dict = {}
+    for attribute in attributes:
+        indexed.setdefault(str(attribute.get('id')), attribute)
+    return indexed
+
+def flatten_road_reference(location: dict[str, list]) -> dict[str, list]:
+    """Flatten the lokasjon columns of a frame, given as lists of row values, in one traversal per row.
+
+    Returns the derived and replaced columns of populate_road_reference. A top level function so it can run in worker processes.
+    """
+    def names(values, key: str) -> list|None:
+        return [value.get(key, None) for value in values if isinstance(value, dict)] if isinstance(values, list) else None
+
+    flattened : dict[str, list] = {}
+    if 'lokasjon.kontraktsområder' in location:
+        flattened['lokasjon.kontraktsområder'] = [names(kontraktsområder, 'navn') for kontraktsområder in location['lokasjon.kontraktsområder']]
+
+    if 'lokasjon.vegforvaltere' in location:
+        flattened['lokasjon.vegforvaltere'] = [names(vegforvaltere, 'vegforvalter') for vegforvaltere in location['lokasjon.vegforvaltere']]
+
+    if 'lokasjon.adresser' in location:
+        adressekoder, adresser = [], []
+        for row in location['lokasjon.adresser']:
+            if not isinstance(row, list):
+                adressekoder.append(None)
+                adresser.append(None)
+                continue
+            row_adressekoder, row_adresser = [], []
+            for adresse in row:
+                if isinstance(adresse, dict):
+                    row_adressekoder.append(adresse.get('adressekode', None))
+                    row_adresser.append(adresse.get('navn', None))
+            adressekoder.append(row_adressekoder)
+            adresser.append(row_adresser)
+        flattened['Adressekoder'] = adressekoder
+        flattened['lokasjon.adresser'] = adresser
+
+    if 'lokasjon.vegsystemreferanser' in location:
+        list_columns : list[str] = ['Vegkategorier', 'Vegfaser', 'Vegnumre', 'Vegsystemreferanseretning', 'Sideposisjoner', 'lokasjon.vegsystemreferanser']
+        flag_columns : list[str] = ['Strekning', 'Kryssystem', 'Sideanlegg']
+        columns : dict[str, list] = {col: [] for col in list_columns + flag_columns}
+        for row in location['lokasjon.vegsystemreferanser']:
+            if not isinstance(row, list):
+                for col in list_columns:
+                    columns[col].append(None)
+                for col in flag_columns:
+                    columns[col].append(False)
+                continue
+            vegkategorier, vegfaser, vegnumre, retninger, sideposisjoner = set(), set(), set(), set(), set()
+            kortformer : list = []
+            strekning, kryssystem, sideanlegg = False, False, False
+            for vegsystemreferanse in row:
+                if not isinstance(vegsystemreferanse, dict):
+                    continue
+                vegsystem : dict = vegsystemreferanse.get('vegsystem', {})
+                metrert_lokasjon : dict = vegsystemreferanse.get('metrertLokasjon', {})
+                vegkategorier.add(vegsystem.get('vegkategori', None))
+                vegfaser.add(vegsystem.get('fase', None))
+                vegnumre.add(vegsystem.get('nummer', None))
+                retninger.add(metrert_lokasjon.get('retning', None))
+                sideposisjoner.add(metrert_lokasjon.get('sideposisjon', None))
+                kortformer.append(vegsystemreferanse.get('kortform', None))
+                strekning = strekning or 'strekning' in vegsystemreferanse
+                kryssystem = kryssystem or 'kryssystem' in vegsystemreferanse
+                sideanlegg = sideanlegg or 'sideanlegg' in vegsystemreferanse
+            columns['Vegkategorier'].append(list(vegkategorier))
+            columns['Vegfaser'].append(list(vegfaser))
+            columns['Vegnumre'].append(list(vegnumre))
+            columns['Vegsystemreferanseretning'].append(list(retninger))
+            columns['Sideposisjoner'].append(list(sideposisjoner))
+            columns['lokasjon.vegsystemreferanser'].append(kortformer)
+            columns['Strekning'].append(strekning)
+            columns['Kryssystem'].append(kryssystem)
+            columns['Sideanlegg'].append(sideanlegg)
+        flattened.update(columns)
+
+    if 'lokasjon.stedfestinger' in location:
+        stedfestingstyper, stedfestinger = [], []
+        for row in location['lokasjon.stedfestinger']:
+            if not isinstance(row, list):
+                stedfestingstyper.append(None)
+                stedfestinger.append(None)
+                continue
+            row_typer : set = set()
+            row_kortformer : list = []
+            for stedfesting in row:
+                if isinstance(stedfesting, dict):
+                    row_typer.add(stedfesting.get('type', None))
+                    row_kortformer.append(stedfesting.get('kortform', None))
+            stedfestingstyper.append(list(row_typer))
+            stedfestinger.append(row_kortformer)
+        flattened['Stedfestingstyper'] = stedfestingstyper
+        flattened['lokasjon.stedfestinger'] = stedfestinger
+
+    if 'lokasjon.riksvegruter' in location:
+        flattened['lokasjon.riksvegruter'] = [names(riksvegruter, 'riksvegrute') for riksvegruter in location['lokasjon.riksvegruter']]
+    return flattened
+
+def fetch_page(api_url: str) -> dict|None:
+    @api_caller(api_url=api_url)
+    def fetcher(data=None) -> dict|None:
+        return data
+    return fetcher()
+
+def iter_pages(api_url: str, label: str = "", prefetch: int = 2):
+    """Yield the pages of a paginated query, following metadata.neste.href.
+
+    Pages are fetched by a background thread into a queue holding at most prefetch pages,
+    so the next request is in flight while the caller processes the current page. Only an empty page or a
+    missing or repeated neste ends the pages, a page that cannot be fetched raises RuntimeError.
+    """
+    end_of_pages = object()
+    pages : queue.Queue = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+
+    def put(item) -> None:
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def producer(url: str) -> None:
+        total_fetched = 0
+        try:
+            while not stop.is_set():
+                data : dict|None = fetch_page(url)
+                if data is None:
+                    # get_json gives up after its retries, a server error or a lost connection. Ending the pages here would
+                    # pass a truncated download off as complete, so the error is raised and the last checkpoint is kept.
+                    raise RuntimeError(f"{label}Fetching {url} failed, the download is incomplete.")
+                if data.get('metadata', {}).get('returnert', 0) == 0:
+                    break
+                total_fetched += data.get('metadata', {}).get('returnert', 0)
+                print(f"{label}Total fetched: {total_fetched}")
+
+                next_url : str = data.get('metadata', {}).get('neste', {}).get('href', "")
+                if next_url == url or not next_url:
+                    break
+                put(data)
+                url = next_url
+        except Exception as error:
+            put(error)
+        finally:
+            put(end_of_pages)
+
+    thread = threading.Thread(target=producer, args=(api_url,), daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = pages.get()
+            if item is end_of_pages:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+def normalize_page(data: dict, fields: dict[str, str]|None = None) -> pd.DataFrame:
+    if fields:
+        return decode_objects(data.get('objekter', []), fields)
+    return pd.json_normalize(data.get('objekter', []))
+
+def fetch_pages(api_url: str, label: str = "", prefetch: int = 2, fields: dict[str, str]|None = None) -> list[pd.DataFrame]:
+    return [normalize_page(data, fields) for data in iter_pages(api_url, label=label, prefetch=prefetch)]
+
+def build_shards(api_query_parameters: dict, shard_by: str, shard_values: list|None = None) -> list[dict]:
+    """Split a query into independent queries, one per value of shard_by.
+
+    If shard_values is not given, an existing comma separated value of shard_by is split,
+    otherwise all counties are used for 'fylke' and all road categories for 'vegsystemreferanse'.
+    """
+    if shard_values is None:
+        if shard_by in api_query_parameters:
+            shard_values = str(api_query_parameters[shard_by]).split(',')
+        else:
+            match shard_by:
+                case 'fylke':
+                    shard_values = COUNTIES
+                case 'vegsystemreferanse':
+                    shard_values = ROAD_CATEGORIES
+                case _:
+                    raise ValueError(f"No default shard values for '{shard_by}', pass shard_values explicitly.")
+    return [{**api_query_parameters, shard_by: str(value).strip()} for value in shard_values]
+
+def fetch_shards(api_urls: list[str], max_workers: int = 4, fields: dict[str, str]|None = None) -> list[pd.DataFrame]:
+    # Each shard pages through its own neste-chain, max_workers caps the number of concurrent requests against the API.
+    def fetch_shard(shard_number: int, api_url: str) -> list[pd.DataFrame]:
+        return fetch_pages(api_url, label=f"[shard {shard_number+1}/{len(api_urls)}] ", fields=fields)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        shards = executor.map(fetch_shard, range(len(api_urls)), api_urls)
+        return [df for shard in shards for df in shard]
+
+def stream_shards(api_urls: list[str], writer: ChunkWriter, chunk_pages: int = 10, max_workers: int = 4, unique_columns: list[str]|None = None, transform=None, fields: dict[str, str]|None = None) -> int:
+    """Download the queries in api_urls and write every chunk_pages pages to writer as they arrive.
+
+    After every chunk the neste cursor of the shard is checkpointed together with the chunk, and
+    shards with a checkpoint in writer continue from their cursor instead of from the first page.
+    Only the unique keys of written rows are kept in memory, which is used to drop rows
+    already written by another shard when unique_columns is given. Returns the number of rows written.
+    """
+    seen_keys : set = set()
+    seen_lock = threading.Lock()
+    if unique_columns:
+        for df in read_chunk_columns(writer.path, unique_columns):
+            seen_keys.update(df.itertuples(index=False, name=None))
+
+    def write(df_list: list[pd.DataFrame], shard: str, checkpoint: dict) -> int:
+        df : pd.DataFrame = pd.concat(df_list, ignore_index=True)
+        if transform is not None:
+            df = transform(df)
+        subset : list[str] = [col for col in unique_columns or [] if col in df.columns]
+        if subset:
+            df = df.drop_duplicates(subset=subset, ignore_index=True)
+            keys : list[tuple] = list(df[subset].itertuples(index=False, name=None))
+            with seen_lock:
+                is_new : list[bool] = [key not in seen_keys for key in keys]
+                seen_keys.update(keys)
+            df = df[is_new]
+        if df.empty:
+            writer.save_checkpoint(shard, checkpoint)
+        else:
+            writer.write(df, shard, checkpoint)
+        return len(df)
+
+    def stream_shard(shard_number: int, api_url: str) -> int:
+        label : str = f"[shard {shard_number+1}/{len(api_urls)}] " if len(api_urls) > 1 else ""
+        checkpoint : dict = writer.get_checkpoint(api_url) or {"next_url": api_url, "pages": 0, "done": False}
+        if checkpoint["done"]:
+            print(f"{label}Already downloaded, skipping.")
+            return 0
+        if checkpoint["pages"]:
+            print(f"{label}Resuming after page {checkpoint['pages']}.")
+        rows_written = 0
+        pages : int = checkpoint["pages"]
+        next_url : str = checkpoint["next_url"]
+        df_list : list[pd.DataFrame] = []
+        for data in iter_pages(next_url, label=label):
+            df_list.append(normalize_page(data, fields))
+            pages += 1
+            next_url = data.get('metadata', {}).get('neste', {}).get('href', "")
+            if len(df_list) >= chunk_pages:
+                rows_written += write(df_list, api_url, {"next_url": next_url, "pages": pages, "done": False})
+                df_list = []
+        if df_list:
+            rows_written += write(df_list, api_url, {"next_url": next_url, "pages": pages, "done": True})
+        else:
+            writer.save_checkpoint(api_url, {"next_url": next_url, "pages": pages, "done": True})
+        return rows_written
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return sum(executor.map(stream_shard, range(len(api_urls)), api_urls))
+
+def query_fingerprint(api_urls: list[str], stream_format: str) -> str:
+    return hashlib.sha256(json.dumps([api_urls, stream_format.lower()]).encode("utf-8")).hexdigest()
+
+def drop_duplicate_rows(df: pd.DataFrame, unique_columns: list[str]) -> pd.DataFrame:
+    subset : list[str] = [col for col in unique_columns if col in df.columns]
+    if not subset:
+        return df
+    return df.drop_duplicates(subset=subset, ignore_index=True)
+
 class FeatureTypeDownloader:
-    def __init__(self, feature_type_id: int, environment: str = "prod", **api_query_parameters: str) -> None:
+    unique_columns : list[str] = ['id', 'metadata.versjon']
+
+    def __init__(self, feature_type_id: int, environment: str = "prod", query: Query|None = None, **api_query_parameters: str) -> None:
         self.feature_type_id = feature_type_id
         match environment:
             case 'prod':
@@ -52,50 +332,68 @@ class FeatureTypeDownloader:
                 print("Invalid environment. Choose from 'prod', 'test', 'stm', or 'utv'. Defaulting to 'prod'.")
                 self.base_url = "https://nvdbapiles.atlas.vegvesen.no/"
         self.objects = pd.DataFrame()
-        self.api_query_parameters : dict = api_query_parameters
+        self.stream_path : str|None = None
+        self.query : Query|None = query
+        self.api_query_parameters : dict = query.to_parameters(**api_query_parameters) if query else api_query_parameters
 
-    def build_api_url(self) -> str:
-        query_string : str = "&".join([f"{key}={value}" for key, value in self.api_query_parameters.items()])
+    def build_api_url(self, api_query_parameters: dict|None = None) -> str:
+        if api_query_parameters is None:
+            api_query_parameters = self.api_query_parameters
+        query_string : str = "&".join([f"{key}={value}" for key, value in api_query_parameters.items()])
         return f"{self.base_url}vegobjekter/{self.feature_type_id}?{query_string}"
     
     def get_attributes_from_data_catalogue(self) -> None:
-        data_catalogue_url : str = f"{self.base_url}datakatalog/api/v1/vegobjekttyper/{self.feature_type_id}?inkluder=egenskapstyper"
-
-        @api_caller(api_url=data_catalogue_url)
-        def fetch_attributes(data=None) -> list:
+        def parse_attributes(data=None) -> list:
             if not data:
                 return []
             attributes : list = [str(attr['id'])+'.'+attr['navn'] for attr in data.get('egenskapstyper', []) if attr.get('id') < 100000]
             return attributes
-        self.attributes = fetch_attributes()
+
+        # Served from the cached data catalogue, only asking the API for this type if it is not in the catalogue.
+        feature_type : dict|None = get_feature_type(self.feature_type_id, self.base_url)
+        if feature_type is not None and 'egenskapstyper' in feature_type:
+            self.attributes = parse_attributes(feature_type)
+            return
+        data_catalogue_url : str = f"{self.base_url}datakatalog/api/v1/vegobjekttyper/{self.feature_type_id}?inkluder=egenskapstyper"
+        self.attributes = api_caller(api_url=data_catalogue_url)(parse_attributes)()
     
     def get_relationships_from_data_catalogue(self) -> None:
-        data_catalogue_url : str = f"{self.base_url}datakatalog/api/v1/vegobjekttyper/{self.feature_type_id}?inkluder=relasjonstyper"
-
-        @api_caller(api_url=data_catalogue_url)
-        def fetch_relationships(data=None) -> tuple[list, list]:
+        def parse_relationships(data=None) -> tuple[list, list]:
             if not data:
                 return [], []
             parents : list = [str(parent['innhold']['type']['id'])+'.'+parent['innhold']['type']['navn'] for parent in data.get('relasjonstyper', []).get('foreldre', [])]
             children : list = [str(child['innhold']['type']['id'])+'.'+child['innhold']['type']['navn'] for child in data.get('relasjonstyper', []).get('barn', [])]
             return parents, children
-        self.parents, self.children = fetch_relationships()
+
+        feature_type : dict|None = get_feature_type(self.feature_type_id, self.base_url)
+        if feature_type is not None and 'relasjonstyper' in feature_type:
+            self.parents, self.children = parse_relationships(feature_type)
+            return
+        data_catalogue_url : str = f"{self.base_url}datakatalog/api/v1/vegobjekttyper/{self.feature_type_id}?inkluder=relasjonstyper"
+        self.parents, self.children = api_caller(api_url=data_catalogue_url)(parse_relationships)()
 
     @timing_decorator
-    def populate_columns(self, attributes = True, geometry_attribute_quality_parameters = True, relationships = True, road_reference = True, geometry = True) -> None:
+    def populate_columns(self, attributes = True, geometry_attribute_quality_parameters = True, relationships = True, road_reference = True, geometry = True, workers: int = 1, compact: bool = False) -> None:
         def populate_attributes() -> list[str]:
             if not hasattr(self, 'attributes'):
                 self.get_attributes_from_data_catalogue()
             old_columns : list = self.objects.columns.tolist()
+            # One pass over every row's egenskaper, indexing them on id. All columns are then built from the index.
+            rows : list[dict|None] = [index_attributes(attributes) for attributes in self.objects['egenskaper']]
+            new_columns : dict[str, list] = {}
             for attr in self.attributes:
                 if attr not in self.objects.columns:
                     attr_id : str = attr.split('.')[0]
-                    self.objects['ET_' + attr] = self.objects['egenskaper'].apply(lambda attributes: next((attribute.get('verdi') for attribute in attributes if str(attribute.get('id')) == attr_id), None) if isinstance(attributes, list) else None)
+                    found : list[dict|None] = [row.get(attr_id) if row is not None else None for row in rows]
+                    new_columns['ET_' + attr] = [attribute.get('verdi') if attribute is not None else None for attribute in found]
                     if "Geometri" in attr and geometry_attribute_quality_parameters:
-                        for quality_param in ['Målemetode', 'Datafangstmetode', 'Nøyaktighet', 'Synbarhet', 'MålemetodeHøyde', 'DatafangstmetodeHøyde', 'NøyaktighetHøyde']:
-                            self.objects['ET_' + attr + '.' + quality_param] = self.objects['egenskaper'].apply(lambda attributes: next((attribute.get('kvalitet', {}).get(quality_param[0].lower() + quality_param[1:], None) for attribute in attributes if str(attribute.get('id')) == attr_id), None) if isinstance(attributes, list) else None)
-                        self.objects['ET_' + attr + '.Datafangstdato'] = self.objects['egenskaper'].apply(lambda attributes: next((attribute.get('datafangstdato', None) for attribute in attributes if str(attribute.get('id')) == attr_id), None) if isinstance(attributes, list) else None)
-                        self.objects['ET_' + attr + '.Høydereferanse'] = self.objects['egenskaper'].apply(lambda attributes: next((attribute.get('høydereferanse', None) for attribute in attributes if str(attribute.get('id')) == attr_id), None) if isinstance(attributes, list) else None)
+                        for quality_param in GEOMETRY_QUALITY_PARAMETERS:
+                            key : str = quality_param[0].lower() + quality_param[1:]
+                            new_columns['ET_' + attr + '.' + quality_param] = [attribute.get('kvalitet', {}).get(key, None) if attribute is not None else None for attribute in found]
+                        new_columns['ET_' + attr + '.Datafangstdato'] = [attribute.get('datafangstdato', None) if attribute is not None else None for attribute in found]
+                        new_columns['ET_' + attr + '.Høydereferanse'] = [attribute.get('høydereferanse', None) if attribute is not None else None for attribute in found]
+            columns_frame = pd.DataFrame({col: pd.Series(values, index=self.objects.index, dtype=object).infer_objects() for col, values in new_columns.items()}, index=self.objects.index)
+            self.objects = pd.concat([self.objects.drop(columns=[col for col in new_columns if col in old_columns]), columns_frame], axis=1)
             attribute_columns = [col for col in self.objects.columns if col not in old_columns]
             return attribute_columns
         
@@ -115,33 +413,19 @@ class FeatureTypeDownloader:
             return relationship_columns
 
         def populate_road_reference() -> None:
-            if 'lokasjon.kontraktsområder' in self.objects.columns:
-                self.objects['lokasjon.kontraktsområder'] = self.objects['lokasjon.kontraktsområder'].apply(lambda kontraktsområder: [kontraktsområde.get('navn', None) for kontraktsområde in kontraktsområder if isinstance(kontraktsområde, dict)] if isinstance(kontraktsområder, list) else None)
-
-            if 'lokasjon.vegforvaltere' in self.objects.columns:
-                self.objects['lokasjon.vegforvaltere'] = self.objects['lokasjon.vegforvaltere'].apply(lambda vegforvaltere: [vegforvalter.get('vegforvalter', None) for vegforvalter in vegforvaltere if isinstance(vegforvalter, dict)] if isinstance(vegforvaltere, list) else None)
-
-            if 'lokasjon.adresser' in self.objects.columns:
-                self.objects['Adressekoder'] = self.objects['lokasjon.adresser'].apply(lambda adresser: [adresse.get('adressekode', None) for adresse in adresser if isinstance(adresse, dict)] if isinstance(adresser, list) else None)
-                self.objects['lokasjon.adresser'] = self.objects['lokasjon.adresser'].apply(lambda adresser: [adresse.get('navn', None) for adresse in adresser if isinstance(adresse, dict)] if isinstance(adresser, list) else None)
-
-            if 'lokasjon.vegsystemreferanser' in self.objects.columns:
-                self.objects['Vegkategorier'] = self.objects['lokasjon.vegsystemreferanser'].apply(lambda vegsystemreferanser: list(set([vegsystemreferanse.get('vegsystem', {}).get('vegkategori', None) for vegsystemreferanse in vegsystemreferanser if isinstance(vegsystemreferanse, dict)])) if isinstance(vegsystemreferanser, list) else None)
-                self.objects['Vegfaser'] = self.objects['lokasjon.vegsystemreferanser'].apply(lambda vegsystemreferanser: list(set([vegsystemreferanse.get('vegsystem', {}).get('fase', None) for vegsystemreferanse in vegsystemreferanser if isinstance(vegsystemreferanse, dict)])) if isinstance(vegsystemreferanser, list) else None)
-                self.objects['Vegnumre'] = self.objects['lokasjon.vegsystemreferanser'].apply(lambda vegsystemreferanser: list(set([vegsystemreferanse.get('vegsystem', {}).get('nummer', None) for vegsystemreferanse in vegsystemreferanser if isinstance(vegsystemreferanse, dict)])) if isinstance(vegsystemreferanser, list) else None)
-                self.objects['Strekning'] = self.objects['lokasjon.vegsystemreferanser'].apply(lambda vegsystemreferanser: False if vegsystemreferanser != vegsystemreferanser else (True if any(isinstance(vegsystemreferanse, dict) and 'strekning' in vegsystemreferanse for vegsystemreferanse in vegsystemreferanser) else False))
-                self.objects['Kryssystem'] = self.objects['lokasjon.vegsystemreferanser'].apply(lambda vegsystemreferanser: False if vegsystemreferanser != vegsystemreferanser else (True if any(isinstance(vegsystemreferanse, dict) and 'kryssystem' in vegsystemreferanse for vegsystemreferanse in vegsystemreferanser) else False))
-                self.objects['Sideanlegg'] = self.objects['lokasjon.vegsystemreferanser'].apply(lambda vegsystemreferanser: False if vegsystemreferanser != vegsystemreferanser else (True if any(isinstance(vegsystemreferanse, dict) and 'sideanlegg' in vegsystemreferanse for vegsystemreferanse in vegsystemreferanser) else False))
-                self.objects['Vegsystemreferanseretning'] = self.objects['lokasjon.vegsystemreferanser'].apply(lambda vegsystemreferanser: list(set([vegsystemreferanse.get('metrertLokasjon', {}).get('retning', None) for vegsystemreferanse in vegsystemreferanser if isinstance(vegsystemreferanse, dict)])) if isinstance(vegsystemreferanser, list) else None)
-                self.objects['Sideposisjoner'] = self.objects['lokasjon.vegsystemreferanser'].apply(lambda vegsystemreferanser: list(set([vegsystemreferanse.get('metrertLokasjon', {}).get('sideposisjon', None) for vegsystemreferanse in vegsystemreferanser if isinstance(vegsystemreferanse, dict)])) if isinstance(vegsystemreferanser, list) else None)
-                self.objects['lokasjon.vegsystemreferanser'] = self.objects['lokasjon.vegsystemreferanser'].apply(lambda vegsystemreferanser: [vegsystemreferanse.get('kortform', None) for vegsystemreferanse in vegsystemreferanser if isinstance(vegsystemreferanse, dict)] if isinstance(vegsystemreferanser, list) else None)
-
-            if 'lokasjon.stedfestinger' in self.objects.columns:
-                self.objects['Stedfestingstyper'] = self.objects['lokasjon.stedfestinger'].apply(lambda stedfestinger: list(set([stedfesting.get('type', None) for stedfesting in stedfestinger if isinstance(stedfesting, dict)])) if isinstance(stedfestinger, list) else None)
-                self.objects['lokasjon.stedfestinger'] = self.objects['lokasjon.stedfestinger'].apply(lambda stedfestinger: [stedfesting.get('kortform', None) for stedfesting in stedfestinger if isinstance(stedfesting, dict)] if isinstance(stedfestinger, list) else None)
-
-            if 'lokasjon.riksvegruter' in self.objects.columns:
-                self.objects['lokasjon.riksvegruter'] = self.objects['lokasjon.riksvegruter'].apply(lambda riksvegruter: [riksvegrute.get('riksvegrute', None) for riksvegrute in riksvegruter if isinstance(riksvegrute, dict)] if isinstance(riksvegruter, list) else None)
+            location : dict[str, list] = {col: self.objects[col].tolist() for col in LOCATION_COLUMNS if col in self.objects.columns}
+            if not location:
+                return
+            if workers > 1 and len(self.objects) >= 2 * ROAD_REFERENCE_CHUNK_SIZE:
+                # Fan out row chunks to worker processes, only worth it for very large frames as the rows have to be pickled.
+                chunks : list[dict[str, list]] = [{col: values[i:i+ROAD_REFERENCE_CHUNK_SIZE] for col, values in location.items()} for i in range(0, len(self.objects), ROAD_REFERENCE_CHUNK_SIZE)]
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    flattened_chunks : list[dict[str, list]] = list(executor.map(flatten_road_reference, chunks))
+                flattened : dict[str, list] = {col: [value for chunk in flattened_chunks for value in chunk[col]] for col in flattened_chunks[0]}
+            else:
+                flattened = flatten_road_reference(location)
+            for col, values in flattened.items():
+                self.objects[col] = values
 
         def rename_columns() -> None:
             column_name_mapping : dict = {
@@ -171,67 +455,157 @@ class FeatureTypeDownloader:
             filtered_columns : dict = {col: new_col for col, new_col in column_name_mapping.items() if col in self.objects.columns}
             self.objects.rename(columns=filtered_columns, inplace=True)
 
-        ac, rc, rrc, gc = [], [], [], []
-        if attributes:
-            ac = populate_attributes()
-        if relationships:
-            rc = populate_relationships()
-        if road_reference:
-            populate_road_reference()
-            rrc = ['Kommuner', 'Fylker', 'Vegforvaltere', 'Kontraktsområder', 'Adresser', 'Adressekoder', 
-                   'Riksvegruter', 'Vegkategorier', 'Vegfaser', 'Vegnumre', 'Vegsystemreferanser', 'Vegsystemreferanseretning', 'Sideposisjoner', 'Strekning', 'Kryssystem', 'Sideanlegg', 'Stedfestinger', 
-                   'Stedfestingstyper', 'Stedfestingslengde', 'Lokasjonsgeometri']
-        if geometry:
-            gc = ['Geometri', 'Geometrilengde', 'Geometriareal', 'Geometri_SRID', 'Har_egengeometri']
-        rename_columns()
-
-        columns : list[str] = [col_name for col_name in ['nvdbId', 'VT_ID', 'VT_Navn', 'Versjon', 'Startdato', 'Sluttdato', 'Sist_modifisert'] + ac + rc + rrc + gc if col_name in self.objects.columns]
-        self.objects : pd.DataFrame = self.objects[columns]
-
-    def download(self) -> bool:
-        api_url = self.build_api_url()
-        total_fetched = 0
-        df_list = []
+        def populate() -> None:
+            ac, rc, rrc, gc = [], [], [], []
+            if attributes:
+                ac = populate_attributes()
+            if relationships:
+                rc = populate_relationships()
+            if road_reference:
+                populate_road_reference()
+                rrc = ['Kommuner', 'Fylker', 'Vegforvaltere', 'Kontraktsområder', 'Adresser', 'Adressekoder', 
+                       'Riksvegruter', 'Vegkategorier', 'Vegfaser', 'Vegnumre', 'Vegsystemreferanser', 'Vegsystemreferanseretning', 'Sideposisjoner', 'Strekning', 'Kryssystem', 'Sideanlegg', 'Stedfestinger', 
+                       'Stedfestingstyper', 'Stedfestingslengde', 'Lokasjonsgeometri']
+            if geometry:
+                gc = ['Geometri', 'Geometrilengde', 'Geometriareal', 'Geometri_SRID', 'Har_egengeometri']
+            rename_columns()
+
+            columns : list[str] = [col_name for col_name in ['nvdbId', 'VT_ID', 'VT_Navn', 'Versjon', 'Startdato', 'Sluttdato', 'Sist_modifisert'] + ac + rc + rrc + gc if col_name in self.objects.columns]
+            self.objects = self.objects[columns]
+
+        if self.stream_path and self.objects.empty:
+            # Streamed download, populate and rewrite one chunk at a time.
+            writer = ChunkWriter.open(self.stream_path)
+            if compact and writer.file_type != 'parquet':
+                print("Compact chunks need the parquet stream format, csv chunks are left in the usual layout.")
+            for chunk_number, chunk in enumerate(iter_chunks(self.stream_path)):
+                self.objects = chunk
+                populate()
+                if compact and writer.file_type == 'parquet':
+                    self.objects = compact_frame(self.objects) # Parquet keeps the Arrow list and dictionary types
+                writer.rewrite(chunk_number, self.objects)
+            self.objects = pd.DataFrame()
+        else:
+            populate()
+            if compact:
+                self.objects = compact_frame(self.objects) # Arrow lists, categoricals and datetimes, expand_frame gives back the usual layout
+
+    def download(self, shard_by: str|None = None, shard_values: list|None = None, max_workers: int = 4, stream_to: str|None = None, chunk_pages: int = 10, stream_format: str = "parquet", resume: bool = True, fields: dict[str, str]|None = None) -> bool:
+        if stream_to:
+            # Streaming mode: chunks of chunk_pages pages are written to the stream_to directory instead of being kept in self.objects.
+            # With resume, an interrupted download of the same query continues from its last checkpointed page.
+            queries : list[dict] = build_shards(self.api_query_parameters, shard_by, shard_values) if shard_by else [self.api_query_parameters]
+            api_urls : list[str] = [self.build_api_url(query) for query in queries]
+            fingerprint : str = query_fingerprint(api_urls + sorted(fields or {}), stream_format)
+            writer : ChunkWriter = ChunkWriter.resume(stream_to, stream_format, fingerprint) if resume else ChunkWriter(stream_to, stream_format, fingerprint)
+            stream_shards(api_urls, writer, chunk_pages=chunk_pages, max_workers=max_workers, unique_columns=self.unique_columns if shard_by else None, transform=self.query.apply_local_filters if self.query else None, fields=fields)
+            self.stream_path = stream_to
+            self.objects = pd.DataFrame()
+            return len(writer.manifest["chunks"]) > 0
+
+        if shard_by:
+            api_urls : list[str] = [self.build_api_url(shard) for shard in build_shards(self.api_query_parameters, shard_by, shard_values)]
+            df_list : list[pd.DataFrame] = fetch_shards(api_urls, max_workers=max_workers, fields=fields)
+        else:
+            df_list = fetch_pages(self.build_api_url(), fields=fields)
 
-        def fetch_objects(new_url=None) -> dict|None:
-            @api_caller(api_url=new_url)
-            def fetcher(data=None) -> dict|None:
-                return data
-            return fetcher()
-            
-        while True:
-            data : dict|None = fetch_objects(api_url)
-            if not data or data.get('metadata', {}).get('returnert', 0) == 0:
-                break
-            total_fetched += data.get('metadata', {}).get('returnert', 0)
-            print(f"Total fetched: {total_fetched}")
-            
-            next_url : str = data.get('metadata', {}).get('neste', {}).get('href', "")
-            if next_url == api_url or not next_url:
-                break
-            df_list.append(pd.json_normalize(data.get('objekter', [])))
-            api_url: str = next_url
-            
         if df_list:
             self.objects = pd.concat(df_list, ignore_index=True)
+            if shard_by:
+                self.objects = drop_duplicate_rows(self.objects, self.unique_columns) # Objects spanning several shards are returned once per shard
+            if self.query:
+                self.objects = self.query.apply_local_filters(self.objects)
             return True
         else:
             return False
         
+    def sync(self, store_path: str, prune: bool = True) -> bool:
+        """Bring a local store of this feature type up to date and load it into self.objects.
+
+        The first run, or a run with other query parameters than the store was made with, downloads everything.
+        Later runs only fetch objects changed since the last sync (endret_etter), upsert them on id and version
+        and drop closed versions. With prune, the ids of all current objects are listed with inkluder=minimum,
+        which drops objects that were closed or removed since the last sync and are therefore not returned as changed.
+        If a page of either listing cannot be fetched, the RuntimeError from iter_pages aborts the sync before the store
+        is saved. A partial id listing would otherwise prune every object after the failed page for good.
+        """
+        fingerprint : str = query_fingerprint([self.build_api_url()], "sync")
+        all_versions : bool = str(self.api_query_parameters.get('alle_versjoner', 'false')).lower() == 'true'
+        started : str = pd.Timestamp.now().strftime("%Y-%m-%dT%H:%M:%S")
+        objects, state = load_store(store_path)
+
+        if objects.empty or state.get("fingerprint") != fingerprint:
+            print("No local store for this query, downloading everything.")
+            if not self.download():
+                return False
+            objects = self.objects
+        else:
+            since : str = (pd.Timestamp(state["last_modified"]) - pd.Timedelta(seconds=1)).strftime("%Y-%m-%dT%H:%M:%S") # Overlap one second, upserting an object twice is harmless
+            df_list : list[pd.DataFrame] = fetch_pages(self.build_api_url({**self.api_query_parameters, 'endret_etter': since}))
+            changed : pd.DataFrame = pd.concat(df_list, ignore_index=True) if df_list else pd.DataFrame()
+            if self.query:
+                changed = self.query.apply_local_filters(changed)
+            print(f"{len(changed)} objects changed since {since}")
+            objects = upsert_objects(objects, changed, all_versions=all_versions)
+            if prune:
+                # Must be the complete listing, fetch_pages raises rather than returning the pages before a failure.
+                current_ids : pd.DataFrame = pd.concat(fetch_pages(self.build_api_url({**self.api_query_parameters, 'inkluder': 'minimum'})) or [pd.DataFrame({'id': []})], ignore_index=True)
+                objects = objects[objects['id'].isin(current_ids['id'])]
+            if not all_versions:
+                objects = drop_closed_versions(objects)
+            objects = sort_objects(objects)
+
+        save_store(store_path, objects, {
+            "fingerprint": fingerprint,
+            "feature_type_id": self.feature_type_id,
+            "last_modified": last_modified(objects) or started,
+            "synced": started
+        })
+        self.objects = objects
+        return not objects.empty
+
     def export(self, file_name: str, file_type: str = "csv") -> None:
+        if file_type.lower() in COLUMNAR_FILE_TYPES:
+            if self.stream_path and self.objects.empty:
+                export_columnar_chunks(lambda: iter_chunks(self.stream_path), file_name, file_type)
+            else:
+                export_columnar(self.objects, file_name, file_type)
+            return
+        if self.stream_path and self.objects.empty:
+            export_chunks(self.stream_path, file_name, file_type)
+            return
+        # Text exports are written in the usual layout, lists as Python lists and dates as strings.
+        objects : pd.DataFrame = expand_frame(self.objects) if is_compact(self.objects) else self.objects
         match file_type.lower():
             case 'csv':
-                self.objects.to_csv(file_name+'.csv', index=False, sep=';', encoding='utf-8-sig')
+                objects.to_csv(file_name+'.csv', index=False, sep=';', encoding='utf-8-sig')
             case 'excel' | 'xlsx':
-                self.objects.to_excel(file_name+'.xlsx', index=False)
+                objects.to_excel(file_name+'.xlsx', index=False)
             case 'txt':
-                self.objects.to_csv(file_name+'.txt', index=False, sep=';', encoding='utf-8-sig')
+                objects.to_csv(file_name+'.txt', index=False, sep=';', encoding='utf-8-sig')
             case _:
-                print("Unsupported file type. Supported types are: csv, excel/xlsx, json. Defaulting to csv.")
-                self.objects.to_csv(file_name+'.csv', index=False, sep=';', encoding='utf-8-sig')
+                print("Unsupported file type. Supported types are: csv, txt, excel/xlsx, parquet, geoparquet, arrow, gpkg. Defaulting to csv.")
+                objects.to_csv(file_name+'.csv', index=False, sep=';', encoding='utf-8-sig')
+
+    def to_database(self, sink: DatabaseSink|str, table: str|None = None, key_columns: list[str]|None = None) -> int:
+        """Upsert the objects into a database table, vegobjekter_<feature type id> by default, see DatabaseSink.
+
+        sink is a DatabaseSink or an ODBC connection string. Streamed downloads are written one chunk at a time.
+        """
+        table = table or f"vegobjekter_{self.feature_type_id}"
+        database = DatabaseSink(sink) if isinstance(sink, str) else sink
+        try:
+            if self.stream_path and self.objects.empty:
+                return database.write_chunks(iter_chunks(self.stream_path), table, key_columns)
+            return database.write(self.objects, table, key_columns)
+        finally:
+            if database is not sink:
+                database.close()
 
 class RoadNetworkDownloader:
-    def __init__(self, environment: str = "prod", **api_query_parameters: str):
+    unique_columns : list[str] = ['veglenkesekvensid', 'startposisjon', 'sluttposisjon', 'vegsystemreferanse.kortform']
+
+    def __init__(self, environment: str = "prod", query: Query|None = None, **api_query_parameters: str):
         match environment:
             case 'prod':
                 self.base_url = "https://nvdbapiles.atlas.vegvesen.no/"
@@ -246,55 +620,87 @@ class RoadNetworkDownloader:
                 self.base_url = "https://nvdbapiles.atlas.vegvesen.no/"
 
         self.road_segments = pd.DataFrame()
-        self.api_query_parameters = api_query_parameters
+        self.stream_path : str|None = None
+        self.query : Query|None = query
+        self.api_query_parameters = query.to_parameters(**api_query_parameters) if query else api_query_parameters
 
-    def build_api_url(self) -> str:
-        query_string = "&".join([f"{key}={value}" for key, value in self.api_query_parameters.items()])
+    def build_api_url(self, api_query_parameters: dict|None = None) -> str:
+        if api_query_parameters is None:
+            api_query_parameters = self.api_query_parameters
+        query_string = "&".join([f"{key}={value}" for key, value in api_query_parameters.items()])
         return f"{self.base_url}vegnett/api/v4/veglenkesekvenser/segmentert?{query_string}"
     
-    def download(self) -> bool:
-        api_url = self.build_api_url()
-        total_fetched = 0
-        df_list = []
+    def filter_segments(self, road_segments: pd.DataFrame) -> pd.DataFrame:
+        road_segments = road_segments[road_segments['vegsystemreferanse.vegsystem.nummer'] != 99999] #Used for internal testing
+        if self.query is None or not self.query.phases: # Phases in the query are already filtered by the API
+            road_segments = road_segments[road_segments['vegsystemreferanse.vegsystem.fase'] == 'V'] #Only drivable roads
+        if self.query is not None:
+            road_segments = self.query.apply_local_filters(road_segments)
+        return road_segments
 
-        def fetch_segments(new_url=None):
-            @api_caller(api_url=new_url)
-            def fetcher(data=None) -> dict|None:
-                return data
-            return fetcher()
-            
-        while True:
-            data = fetch_segments(api_url)
-            if not data or data.get('metadata', {}).get('returnert', 0) == 0:
-                break
-            total_fetched += data.get('metadata', {}).get('returnert', 0)
-            print(f"Total fetched: {total_fetched}")
-            
-            next_url = data.get('metadata', {}).get('neste', {}).get('href')
-            if next_url == api_url or not next_url:
-                break
-            df_list.append(pd.json_normalize(data.get('objekter', [])))
-            api_url = next_url
+    def download(self, shard_by: str|None = None, shard_values: list|None = None, max_workers: int = 4, stream_to: str|None = None, chunk_pages: int = 10, stream_format: str = "parquet", resume: bool = True, fields: dict[str, str]|None = None) -> bool:
+        if stream_to:
+            queries = build_shards(self.api_query_parameters, shard_by, shard_values) if shard_by else [self.api_query_parameters]
+            api_urls = [self.build_api_url(query) for query in queries]
+            fingerprint = query_fingerprint(api_urls + sorted(fields or {}), stream_format)
+            writer = ChunkWriter.resume(stream_to, stream_format, fingerprint) if resume else ChunkWriter(stream_to, stream_format, fingerprint)
+            stream_shards(api_urls, writer, chunk_pages=chunk_pages, max_workers=max_workers, unique_columns=self.unique_columns if shard_by else None, transform=self.filter_segments, fields=fields)
+            self.stream_path = stream_to
+            self.road_segments = pd.DataFrame()
+            return len(writer.manifest["chunks"]) > 0
+
+        if shard_by:
+            api_urls = [self.build_api_url(shard) for shard in build_shards(self.api_query_parameters, shard_by, shard_values)]
+            df_list = fetch_shards(api_urls, max_workers=max_workers, fields=fields)
+        else:
+            df_list = fetch_pages(self.build_api_url(), fields=fields)
             
         if df_list:
             self.road_segments = pd.concat(df_list, ignore_index=True)
-            self.road_segments = self.road_segments[self.road_segments['vegsystemreferanse.vegsystem.nummer'] != 99999] #Used for internal testing
-            self.road_segments = self.road_segments[self.road_segments['vegsystemreferanse.vegsystem.fase'] == 'V'] #Only drivable roads
+            if shard_by:
+                self.road_segments = drop_duplicate_rows(self.road_segments, self.unique_columns)
+            self.road_segments = self.filter_segments(self.road_segments)
             return True
         else:
             return False
         
     def export(self, file_name: str, file_type: str = "csv") -> None:
+        if file_type.lower() in COLUMNAR_FILE_TYPES:
+            if self.stream_path and self.road_segments.empty:
+                export_columnar_chunks(lambda: iter_chunks(self.stream_path), file_name, file_type)
+            else:
+                export_columnar(self.road_segments, file_name, file_type)
+            return
+        if self.stream_path and self.road_segments.empty:
+            export_chunks(self.stream_path, file_name, file_type)
+            return
+        # Text exports are written in the usual layout, lists as Python lists and dates as strings.
+        road_segments : pd.DataFrame = expand_frame(self.road_segments) if is_compact(self.road_segments) else self.road_segments
         match file_type.lower():
             case 'csv':
-                self.road_segments.to_csv(file_name+'.csv', index=False, sep=';', encoding='utf-8-sig')
+                road_segments.to_csv(file_name+'.csv', index=False, sep=';', encoding='utf-8-sig')
             case 'excel' | 'xlsx': #Deprecated, use csv or txt instead
-                self.road_segments.to_excel(file_name+'.xlsx', index=False)
+                road_segments.to_excel(file_name+'.xlsx', index=False)
             case 'txt':
-                self.road_segments.to_csv(file_name+'.txt', index=False, sep=';', encoding='utf-8-sig')
+                road_segments.to_csv(file_name+'.txt', index=False, sep=';', encoding='utf-8-sig')
             case _:
-                print("Unsupported file type. Supported types are: csv, excel/xlsx, json. Defaulting to csv.")
-                self.road_segments.to_csv(file_name+'.csv', index=False, sep=';', encoding='utf-8-sig')
+                print("Unsupported file type. Supported types are: csv, txt, excel/xlsx, parquet, geoparquet, arrow, gpkg. Defaulting to csv.")
+                road_segments.to_csv(file_name+'.csv', index=False, sep=';', encoding='utf-8-sig')
+
+    def to_database(self, sink: DatabaseSink|str, table: str = "vegnett", key_columns: list[str]|None = None) -> int:
+        """Upsert the road segments into a database table, keyed on unique_columns by default, see DatabaseSink.
+
+        sink is a DatabaseSink or an ODBC connection string. Streamed downloads are written one chunk at a time.
+        """
+        key_columns = key_columns or self.unique_columns
+        database = DatabaseSink(sink) if isinstance(sink, str) else sink
+        try:
+            if self.stream_path and self.road_segments.empty:
+                return database.write_chunks(iter_chunks(self.stream_path), table, key_columns)
+            return database.write(self.road_segments, table, key_columns)
+        finally:
+            if database is not sink:
+                database.close()
     
 if __name__ == "__main__":
     instance = FeatureTypeDownloader(feature_type_id=487, environment='prod', inkluder='alle', alle_versjoner="false")
@@ -330,4 +736,17 @@ if __name__ == "__main__":
     # Most useful parameters is probably:
     # fylke (county), one or more county ids, 
     # kommune (municipality), one or more municipality ids,
-    # vegsystemfereranse (road system reference), road category and number, e.g. 'EV6', 'RV3', 'FV65' etc, but can also be just the road category: 'E', 'R' or 'E,R,F'.
\ No newline at end of file
+    # vegsystemfereranse (road system reference), road category and number, e.g. 'EV6', 'RV3', 'FV65' etc, but can also be just the road category: 'E', 'R' or 'E,R,F'.
+
+    # Filters can be built with Query, which sends everything the API can filter on as query parameters:
+    #instance = RoadNetworkDownloader(environment='prod', query=Query().road_category('K', 'P', 'S').phase('V'))
+    #instance = FeatureTypeDownloader(feature_type_id=105, environment='prod', query=Query().county(50).attribute(2021, '>', 60))
+
+    # Large downloads can be split into shards that are downloaded concurrently, e.g. one shard per road category or county:
+    #instance = RoadNetworkDownloader(environment='prod', vegsystemreferanse="K,P,S")
+    #instance.download(shard_by='vegsystemreferanse', max_workers=3)
+    #instance = FeatureTypeDownloader(feature_type_id=487, environment='prod')
+    #instance.download(shard_by='fylke', max_workers=4)
+
+    # Objects and road segments can be upserted into SQL Server (or SQLite) instead of exported, also from streamed downloads:
+    #instance.to_database("DRIVER={ODBC Driver 18 for SQL Server};SERVER=localhost;DATABASE=nvdb;Trusted_Connection=yes;TrustServerCertificate=yes")
\ No newline at end of file
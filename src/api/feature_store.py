@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import pandas as pd
+from .chunked_storage import decode_nested_columns, encode_nested_columns
+
+OBJECTS_FILE : str = "objects.parquet"
+STATE_FILE : str = "sync_state.json"
+
+def load_store(path: str) -> tuple[pd.DataFrame, dict]:
+    """Load a local feature type store, returning its objects and sync state. An empty frame and state if there is none."""
+    if not os.path.exists(os.path.join(path, STATE_FILE)) or not os.path.exists(os.path.join(path, OBJECTS_FILE)):
+        return pd.DataFrame(), {}
+    with open(os.path.join(path, STATE_FILE), "r", encoding="utf-8") as fp:
+        state : dict = json.load(fp)
+    objects : pd.DataFrame = decode_nested_columns(pd.read_parquet(os.path.join(path, OBJECTS_FILE)), state.get("json_columns", []))
+    return objects, state
+
+def save_store(path: str, objects: pd.DataFrame, state: dict) -> None:
+    os.makedirs(path, exist_ok=True)
+    encoded, json_columns = encode_nested_columns(objects)
+    encoded.to_parquet(os.path.join(path, OBJECTS_FILE + ".tmp"), index=False)
+    os.replace(os.path.join(path, OBJECTS_FILE + ".tmp"), os.path.join(path, OBJECTS_FILE))
+    with open(os.path.join(path, STATE_FILE + ".tmp"), "w", encoding="utf-8") as fp:
+        json.dump({**state, "json_columns": json_columns}, fp, ensure_ascii=False, indent=4)
+    os.replace(os.path.join(path, STATE_FILE + ".tmp"), os.path.join(path, STATE_FILE))
+
+def last_modified(objects: pd.DataFrame) -> str|None:
+    """The latest metadata.sist_modifisert in objects, in the format used by the endret_etter parameter."""
+    if 'metadata.sist_modifisert' not in objects.columns or objects['metadata.sist_modifisert'].isna().all():
+        return None
+    return pd.to_datetime(objects['metadata.sist_modifisert']).max().strftime("%Y-%m-%dT%H:%M:%S")
+
+def upsert_objects(objects: pd.DataFrame, changed: pd.DataFrame, all_versions: bool = False) -> pd.DataFrame:
+    """Replace objects with their changed versions.
+
+    Rows of objects with the same id and version as a changed row are replaced. Without all_versions
+    only the current version of an object is kept, so every earlier version of a changed object is dropped.
+    """
+    if changed.empty:
+        return objects
+    if objects.empty:
+        return changed.reset_index(drop=True)
+    if all_versions and 'metadata.versjon' in objects.columns and 'metadata.versjon' in changed.columns:
+        changed_keys = pd.MultiIndex.from_frame(changed[['id', 'metadata.versjon']])
+        keep = ~pd.MultiIndex.from_frame(objects[['id', 'metadata.versjon']]).isin(changed_keys)
+    else:
+        keep = ~objects['id'].isin(changed['id'])
+    return pd.concat([objects[keep], changed], ignore_index=True)
+
+def drop_closed_versions(objects: pd.DataFrame, today: pd.Timestamp|None = None) -> pd.DataFrame:
+    """Drop object versions with an end date (metadata.sluttdato) at or before today."""
+    if 'metadata.sluttdato' not in objects.columns:
+        return objects
+    if today is None:
+        today = pd.Timestamp.now().normalize()
+    end_dates = pd.to_datetime(objects['metadata.sluttdato'], errors='coerce')
+    return objects[end_dates.isna() | (end_dates > today)].reset_index(drop=True)
+
+def sort_objects(objects: pd.DataFrame) -> pd.DataFrame:
+    sort_columns : list[str] = [col for col in ['id', 'metadata.versjon'] if col in objects.columns]
+    if not sort_columns:
+        return objects
+    return objects.sort_values(sort_columns, ignore_index=True)
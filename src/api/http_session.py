@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+import json
+import random
+import threading
+import time
+import requests
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+
+try:
+    import orjson # Optional, decodes large pages several times faster than json
+except ImportError:
+    orjson = None
+
+X_CLIENT : str = "Andryg python"
+MAX_RETRIES : int = 3
+BACKOFF_BASE : float = 1.0 # Seconds, doubled for every retry
+BACKOFF_MAX : float = 60.0
+RETRY_AFTER_MAX : float = 300.0 # Longest Retry-After honoured, a bad header must not stall a worker for good
+TIMEOUT : tuple[float, float] = (10.0, 120.0) # Connect and read timeout
+RETRYABLE_STATUS_CODES : set[int] = {408, 429}
+
+_session : requests.Session|None = None
+_pool_maxsize : int = 0 # pool_maxsize of the adapter mounted on _session
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+_session_lock = threading.Lock()
+
+def get_session(pool_maxsize: int = 16) -> requests.Session:
+    """Return the shared HTTP session.
+
+    The session keeps connections alive between calls and is shared by all downloaders and
+    data catalogue lookups, so long pagination runs reuse the same TCP/TLS connections.
+    pool_maxsize should be at least the number of threads making concurrent requests. Asking for a larger
+    pool than the session has mounts a new adapter of that size, a smaller one keeps the current pool.
+    """
+    global _session, _pool_maxsize
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            session.headers.update({
+                "X-Client": X_CLIENT,
+                "Accept": "application/json",
+                "Accept-Encoding": "gzip, deflate"
+            })
+            _session = session
+        if pool_maxsize > _pool_maxsize:
+            # Requests in flight keep the connections of the old adapter, later requests use the new one.
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+            _pool_maxsize = pool_maxsize
+        return _session
+
+def retry_delay(attempt: int, response: requests.Response|None = None) -> float:
+    if response is not None and response.headers.get("Retry-After"):
+        retry_after : str = response.headers["Retry-After"]
+        try:
+            return min(RETRY_AFTER_MAX, max(0.0, float(retry_after)))
+        except ValueError:
+            try:
+                return min(RETRY_AFTER_MAX, max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time()))
+            except (TypeError, ValueError):
+                pass
+    # Exponential backoff with full jitter, so concurrent workers do not retry in lockstep.
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+def get(url: str, max_retries: int = MAX_RETRIES, **kwargs) -> requests.Response|None:
+    """GET url through the shared session.
+
+    Server errors, timeouts and connection errors are retried with backoff, honouring Retry-After.
+    Client errors (4xx except 408 and 429) are not retried. Returns None if the request failed.
+    """
+    session = get_session()
+    kwargs.setdefault("timeout", TIMEOUT)
+    for attempt in range(max_retries):
+        response = None
+        try:
+            response = session.get(url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as error:
+            print(f"Error: {error}")
+        else:
+            if response.status_code == 200:
+                return response
+            print(response.text)
+            if 400 <= response.status_code < 500 and response.status_code not in RETRYABLE_STATUS_CODES:
+                print(f"Client error {response.status_code}, not retrying.")
+                return None
+        if attempt < max_retries - 1:
+            delay : float = retry_delay(attempt, response)
+            print(f"Error, retrying in {delay:.1f} seconds")
+            time.sleep(delay)
+    print("Max retries reached. Exiting.")
+    return None
+
+def loads(content: bytes|str):
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+def dumps(obj) -> bytes:
+    """Compact UTF-8 JSON."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return _encoder.encode(obj).encode("utf-8")
+
+def get_json(url: str, max_retries: int = MAX_RETRIES, **kwargs) -> dict|None:
+    response = get(url, max_retries=max_retries, **kwargs)
+    if response is None:
+        return None
+    return loads(response.content)
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+
+# Column (as named by pd.json_normalize) and the type it is decoded to.
+# 'object' columns keep the decoded JSON value (lists of egenskaper, stedfestinger, ...) for populate_columns.
+BASE_FIELDS : dict[str, str] = {
+    'id': 'int64',
+    'metadata.type.id': 'int64',
+    'metadata.type.navn': 'string',
+    'metadata.versjon': 'int64',
+    'metadata.startdato': 'datetime64',
+    'metadata.sluttdato': 'datetime64',
+    'metadata.sist_modifisert': 'datetime64',
+}
+ATTRIBUTE_FIELDS : dict[str, str] = {
+    'egenskaper': 'object',
+}
+RELATIONSHIP_FIELDS : dict[str, str] = {
+    'relasjoner.foreldre': 'object',
+    'relasjoner.barn': 'object',
+}
+ROAD_REFERENCE_FIELDS : dict[str, str] = {
+    'lokasjon.kommuner': 'object',
+    'lokasjon.fylker': 'object',
+    'lokasjon.geometri.wkt': 'string',
+    'lokasjon.kontraktsområder': 'object',
+    'lokasjon.vegforvaltere': 'object',
+    'lokasjon.adresser': 'object',
+    'lokasjon.vegsystemreferanser': 'object',
+    'lokasjon.stedfestinger': 'object',
+    'lokasjon.lengde': 'float64',
+    'lokasjon.riksvegruter': 'object',
+}
+GEOMETRY_FIELDS : dict[str, str] = {
+    'geometri.wkt': 'string',
+    'geometri.lengde': 'float64',
+    'geometri.areal': 'float64',
+    'geometri.srid': 'int64',
+    'geometri.egengeometri': 'bool',
+}
+ROAD_SEGMENT_FIELDS : dict[str, str] = {
+    'veglenkesekvensid': 'int64',
+    'veglenkenummer': 'int64',
+    'segmentnummer': 'int64',
+    'startposisjon': 'float64',
+    'sluttposisjon': 'float64',
+    'kortform': 'string',
+    'startnode': 'string',
+    'sluttnode': 'string',
+    'type': 'string',
+    'typeVeg': 'string',
+    'detaljnivå': 'string',
+    'lengde': 'float64',
+    'fylke': 'int64',
+    'kommune': 'int64',
+    'metadata.startdato': 'datetime64',
+    'metadata.sluttdato': 'datetime64',
+    'geometri.wkt': 'string',
+    'geometri.srid': 'int64',
+    'vegsystemreferanse.kortform': 'string',
+    'vegsystemreferanse.vegsystem.vegkategori': 'string',
+    'vegsystemreferanse.vegsystem.fase': 'string',
+    'vegsystemreferanse.vegsystem.nummer': 'int64',
+    'vegsystemreferanse.strekning.retning': 'string',
+    'feltoversikt': 'object',
+}
+
+_MISSING = object()
+
+def page_fields(attributes: bool = True, relationships: bool = True, road_reference: bool = True, geometry: bool = True) -> dict[str, str]:
+    """The fields populate_columns needs for the given flags, to be passed as fields to FeatureTypeDownloader.download."""
+    fields : dict[str, str] = dict(BASE_FIELDS)
+    if attributes:
+        fields.update(ATTRIBUTE_FIELDS)
+    if relationships:
+        fields.update(RELATIONSHIP_FIELDS)
+    if road_reference:
+        fields.update(ROAD_REFERENCE_FIELDS)
+    if geometry:
+        fields.update(GEOMETRY_FIELDS)
+    return fields
+
+def build_field_tree(fields: dict[str, str]) -> dict:
+    """Nest the dotted column names, so every object is walked once for all fields. Leaves hold the column name."""
+    tree : dict = {}
+    for column in fields:
+        node : dict = tree
+        keys : list[str] = column.split('.')
+        for key in keys[:-1]:
+            node = node.setdefault(key, {})
+        node[keys[-1]] = column
+    return tree
+
+def to_column(values: list, dtype: str):
+    match dtype:
+        case 'int64':
+            if any(value is None for value in values):
+                return pd.array(values, dtype='Int64')
+            return np.array(values, dtype=np.int64)
+        case 'float64':
+            return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+        case 'datetime64':
+            return pd.to_datetime(pd.Series(values, dtype=object), format='ISO8601')
+        case 'bool':
+            if any(value is None for value in values):
+                return pd.array(values, dtype='boolean')
+            return np.array(values, dtype=bool)
+        case 'string':
+            return pd.Series(values)
+        case _:
+            return pd.Series(values, dtype=object)
+
+def decode_objects(objects: list[dict], fields: dict[str, str]) -> pd.DataFrame:
+    """Decode the objekter of a page straight into typed columns, skipping every field not in fields.
+
+    Replaces pd.json_normalize for known fields: columns get the same names, but only fields present in
+    at least one object become columns, and ids, dates and numbers get proper dtypes instead of object.
+    """
+    columns : dict = {}
+
+    def walk(node: dict, values: list) -> None:
+        # Columnar walk: every level of the field tree is looked up for all objects at once.
+        for key, child in node.items():
+            child_values : list = [value.get(key, _MISSING) if type(value) is dict else _MISSING for value in values]
+            if isinstance(child, dict):
+                walk(child, child_values)
+            elif any(value is not _MISSING for value in child_values):
+                columns[child] = to_column([None if value is _MISSING else value for value in child_values], fields[child])
+
+    walk(build_field_tree(fields), objects)
+    return pd.DataFrame({column: columns[column] for column in fields if column in columns}, index=pd.RangeIndex(len(objects)))
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+import pandas as pd
+
+ATTRIBUTE_OPERATORS : list[str] = ['=', '!=', '<', '<=', '>', '>=']
+
+class Query:
+    """Typed filters translated to NVDB API query parameters.
+
+    Everything the API can express is sent as query parameters, so the filtering happens server side:
+    phase and road category (vegsystemreferanse), county (fylke), municipality (kommune), attribute values (egenskap),
+    date (tidspunkt), changed since (endret_etter) and bounding box (kartutsnitt). Filters the API cannot express
+    are kept as local filters, applied to the downloaded frame by apply_local_filters.
+
+    Example:
+        Query().road_category('E', 'R').phase('V').county(50).attribute(5277, '>', 3)
+    """
+    def __init__(self) -> None:
+        self.parameters : dict[str, str] = {}
+        self.phases : list[str] = []
+        self.road_categories : list[str] = []
+        self.roads : list[str] = []
+        self.attribute_filters : list[str] = []
+        self.local_filters : list[tuple[str, object]] = []
+
+    def phase(self, *phases: str) -> "Query":
+        """Road phase: V (existing), A (under construction), P (planned), F (fictional)."""
+        self.phases += [phase.upper() for phase in phases]
+        return self
+
+    def road_category(self, *categories: str) -> "Query":
+        """Road category: E, R, F, K, P or S."""
+        self.road_categories += [category.upper() for category in categories]
+        return self
+
+    def road(self, category: str, number: int, phase: str = 'V') -> "Query":
+        """A single road, e.g. road('E', 6) for EV6. Several roads are combined with OR.
+
+        Cannot be combined with road_category or phase: the API reads vegsystemreferanse as a list of alternatives,
+        so EV6 together with R would return all of EV6 and every R road. The phase of a road is given here instead.
+        """
+        self.roads.append(f"{category.upper()}{phase.upper()}{number}")
+        return self
+
+    def county(self, *counties: int|str) -> "Query":
+        self.parameters['fylke'] = ",".join(str(county) for county in counties)
+        return self
+
+    def municipality(self, *municipalities: int|str) -> "Query":
+        self.parameters['kommune'] = ",".join(str(municipality) for municipality in municipalities)
+        return self
+
+    def attribute(self, attribute_id: int, operator: str, value) -> "Query":
+        """Attribute value filter, combined with AND. operator is one of =, !=, <, <=, >, >= or 'in' with a list of values."""
+        if operator == 'in':
+            self.attribute_filters.append("(" + " OR ".join(f"{attribute_id}={format_attribute_value(item)}" for item in value) + ")")
+        elif operator in ATTRIBUTE_OPERATORS:
+            self.attribute_filters.append(f"{attribute_id}{operator}{format_attribute_value(value)}")
+        else:
+            raise ValueError(f"Unsupported operator '{operator}'. Supported operators are: {ATTRIBUTE_OPERATORS + ['in']}.")
+        return self
+
+    def date(self, date: str) -> "Query":
+        """Objects valid on date, 'YYYY-MM-DD'."""
+        self.parameters['tidspunkt'] = date
+        return self
+
+    def modified_after(self, timestamp: str) -> "Query":
+        self.parameters['endret_etter'] = timestamp
+        return self
+
+    def bbox(self, min_x: float, min_y: float, max_x: float, max_y: float, srid: int|None = None) -> "Query":
+        """Bounding box, in the coordinate system of srid (UTM33 if not given)."""
+        self.parameters['kartutsnitt'] = f"{min_x},{min_y},{max_x},{max_y}"
+        if srid is not None:
+            self.parameters['srid'] = str(srid)
+        return self
+
+    def where(self, description: str, mask_function) -> "Query":
+        """Local filter for what the API cannot express: mask_function takes the downloaded frame and returns a boolean mask."""
+        self.local_filters.append((description, mask_function))
+        return self
+
+    def to_parameters(self, **api_query_parameters: str) -> dict[str, str]:
+        """The query parameters of the filters, together with the keyword parameters given to the downloaders.
+
+        Raises ValueError if a keyword parameter is one the query already sets, since one would silently replace the other.
+        """
+        if self.roads and (self.road_categories or self.phases):
+            # All of them end up in vegsystemreferanse, which the API treats as OR, widening the query instead of narrowing it.
+            raise ValueError("road() cannot be combined with road_category() or phase(), the API would return either instead of both. Give the phase in road().")
+        parameters : dict[str, str] = dict(self.parameters)
+        vegsystemreferanser : list[str] = list(self.roads)
+        if self.road_categories or self.phases:
+            # Category and phase combine into one vegsystemreferanse per pair, e.g. EV,RV. Without categories every category is listed.
+            categories : list[str] = self.road_categories or ['E', 'R', 'F', 'K', 'P', 'S']
+            vegsystemreferanser += [category + phase for category in categories for phase in self.phases] if self.phases else categories
+        if vegsystemreferanser:
+            parameters['vegsystemreferanse'] = ",".join(vegsystemreferanser)
+        if self.attribute_filters:
+            parameters['egenskap'] = " AND ".join(self.attribute_filters)
+        collisions : list[str] = [key for key in api_query_parameters if key in parameters]
+        if collisions:
+            raise ValueError(f"{collisions} are set by the query and as keyword parameters, set them in one place only.")
+        return {**parameters, **api_query_parameters}
+
+    def apply_local_filters(self, df: pd.DataFrame) -> pd.DataFrame:
+        for _, mask_function in self.local_filters:
+            if df.empty:
+                break
+            df = df[mask_function(df)]
+        return df
+
+def format_attribute_value(value) -> str:
+    if isinstance(value, str):
+        return f"'{value}'"
+    if value is None:
+        return "null"
+    return str(value)
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+from itertools import chain
+import numpy as np
+import pandas as pd
+
+ID_COLUMNS : list[str] = ['nvdbId', 'id']
+EDGE_COLUMNS : list[str] = ['parent_type', 'parent_id', 'child_type', 'child_id']
+
+def explode_ids(owner_ids: np.ndarray, id_lists) -> tuple[np.ndarray, np.ndarray]:
+    """Pairs of owner id and related id from a column of id lists, as int64 arrays."""
+    id_lists = [ids if isinstance(ids, list) else [] for ids in id_lists]
+    counts = np.fromiter(map(len, id_lists), dtype=np.int64, count=len(id_lists))
+    related = np.fromiter(chain.from_iterable(id_lists), dtype=np.int64, count=int(counts.sum()))
+    return np.repeat(owner_ids, counts), related
+
+def relationship_edges(objects: pd.DataFrame, feature_type_id: int) -> pd.DataFrame:
+    """Parent/child edges of the objects of one feature type, one row per relation with parent_type, parent_id, child_type and child_id.
+
+    Reads the Forelder_/Barn_ columns of populated frames, or relasjoner.foreldre/relasjoner.barn of raw frames.
+    """
+    id_column : str|None = next((col for col in ID_COLUMNS if col in objects.columns), None)
+    if id_column is None:
+        raise KeyError(f"Found no id column in the objects, expected one of: {ID_COLUMNS}.")
+    owner_ids = objects[id_column].to_numpy(dtype=np.int64)
+    edges : list[pd.DataFrame] = []
+
+    def add(owners: np.ndarray, related_type: int, id_lists, is_parent: bool) -> None:
+        owners, related = explode_ids(owners, id_lists)
+        edges.append(pd.DataFrame({
+            'parent_type': np.full(len(owners), related_type if is_parent else feature_type_id, dtype=np.int32),
+            'parent_id': related if is_parent else owners,
+            'child_type': np.full(len(owners), feature_type_id if is_parent else related_type, dtype=np.int32),
+            'child_id': owners if is_parent else related,
+        }))
+
+    for col in objects.columns:
+        for prefix, is_parent in (('Forelder_', True), ('Barn_', False)):
+            if col.startswith(prefix):
+                add(owner_ids, int(col[len(prefix):].split('.')[0]), objects[col], is_parent)
+    for col, is_parent in (('relasjoner.foreldre', True), ('relasjoner.barn', False)):
+        if col not in objects.columns:
+            continue
+        # One list of relations per object, each relation holding the related type and its ids.
+        relations = [(owner, relation) for owner, row in zip(owner_ids, objects[col]) if isinstance(row, list) for relation in row if isinstance(relation, dict)]
+        types = np.array([relation.get('type', {}).get('id', -1) for _, relation in relations], dtype=np.int64)
+        for related_type in np.unique(types):
+            selected = [relations[i] for i in np.flatnonzero(types == related_type)]
+            add(np.array([owner for owner, _ in selected], dtype=np.int64), int(related_type), [relation.get('vegobjekter') for _, relation in selected], is_parent)
+    if not edges:
+        return pd.DataFrame({col: pd.Series(dtype='int32' if col.endswith('type') else 'int64') for col in EDGE_COLUMNS})
+    return pd.concat(edges, ignore_index=True)
+
+class RelationshipGraph:
+    """Parent/child relations between several downloaded feature types, resolved with hash joins.
+
+    frames maps feature type id to its objects, e.g. FeatureTypeDownloader.objects. The relations of all frames
+    are exploded once into int64 edge arrays, a relation listed by both the parent and the child counted once.
+
+    Example, from signs to their sign point and on to its pole:
+        graph = RelationshipGraph({96: signs.objects, 95: sign_points.objects, 470: poles.objects})
+        graph.traverse([96, 95, 470], columns={96: ['Skiltnummer']})
+    """
+    def __init__(self, frames: dict[int, pd.DataFrame]) -> None:
+        self.frames : dict[int, pd.DataFrame] = frames
+        self.edges : pd.DataFrame = pd.concat([relationship_edges(objects, feature_type_id) for feature_type_id, objects in frames.items()], ignore_index=True).drop_duplicates(ignore_index=True)
+
+    def links(self, from_type: int, to_type: int) -> pd.DataFrame:
+        """from_id, to_id pairs between objects of from_type and their parents or children of to_type."""
+        as_child = self.edges[(self.edges['child_type'] == from_type) & (self.edges['parent_type'] == to_type)]
+        as_parent = self.edges[(self.edges['parent_type'] == from_type) & (self.edges['child_type'] == to_type)]
+        return pd.concat([
+            pd.DataFrame({'from_id': as_child['child_id'].to_numpy(), 'to_id': as_child['parent_id'].to_numpy()}),
+            pd.DataFrame({'from_id': as_parent['parent_id'].to_numpy(), 'to_id': as_parent['child_id'].to_numpy()}),
+        ], ignore_index=True)
+
+    def type_columns(self, feature_type_id: int, columns: list[str]|None) -> pd.DataFrame:
+        """The id and the requested columns of one type, prefixed with the type id."""
+        objects : pd.DataFrame = self.frames[feature_type_id]
+        id_column : str = next(col for col in ID_COLUMNS if col in objects.columns)
+        selected = objects[[id_column] + [col for col in (columns or []) if col != id_column]].drop_duplicates(subset=[id_column])
+        selected = selected.astype({id_column: 'int64'})
+        return selected.rename(columns={id_column: 'nvdbId'}).add_prefix(f"{feature_type_id}_")
+
+    def traverse(self, path: list[int], columns: dict[int, list[str]]|None = None, how: str = 'inner') -> pd.DataFrame:
+        """Follow the relations along path, a list of feature type ids, and return one flat row per chain of related objects.
+
+        Each step goes to the parents or children of the next type, whichever the relations hold. The result has
+        <type>_nvdbId (Int64) for every type in path and <type>_<column> for the columns asked for. how='left' keeps
+        objects without a relation of the next type, with empty columns for the rest of the chain.
+        """
+        columns = columns or {}
+        result = self.type_columns(path[0], columns.get(path[0]))
+        result[f"{path[0]}_nvdbId"] = result[f"{path[0]}_nvdbId"].astype('Int64')
+        for from_type, to_type in zip(path, path[1:]):
+            links = self.links(from_type, to_type).rename(columns={'from_id': f"{from_type}_nvdbId", 'to_id': f"{to_type}_nvdbId"})
+            result = result.merge(links, on=f"{from_type}_nvdbId", how=how)
+            # Rows without a relation leave the id missing, which would make the id column float64 with left joins.
+            result[f"{to_type}_nvdbId"] = result[f"{to_type}_nvdbId"].astype('Int64')
+            if to_type in self.frames:
+                result = result.merge(self.type_columns(to_type, columns.get(to_type)), on=f"{to_type}_nvdbId", how='left' if how == 'left' else 'inner')
+        return result.reset_index(drop=True)
@@ -0,0 +1,2 @@
+from .distance import point_to_point_distance, nearest_point, point_to_linestring_distance
+from .spatial_join import SegmentIndex, match_objects_to_segments
\ No newline at end of file
@@ -0,0 +1,121 @@
+import time
+import numpy as np
+
+try:
+    import nvdb_rust # Built from rust/ with: maturin develop --release -m rust/Cargo.toml
+except ImportError:
+    nvdb_rust = None
+
+EARTH_RADIUS : float = 6371008.8 # Mean earth radius in metres, same as the Rust kernel
+METRICS : list[str] = ['planar', 'haversine']
+NEAREST_CHUNK_SIZE : int = 2048 # Rows of a compared against all of b at a time in the NumPy fallback
+
+def as_coordinates(coords, name: str = "coords") -> np.ndarray:
+    """Coordinates as a C-contiguous float64 N×2 or N×3 array, the layout the Rust kernel reads without copying."""
+    coords = np.ascontiguousarray(coords, dtype=np.float64)
+    if coords.ndim == 1 and len(coords) in (2, 3):
+        coords = coords.reshape(1, -1)
+    if coords.ndim != 2 or coords.shape[1] not in (2, 3):
+        raise ValueError(f"{name} must be an N×2 or N×3 array, got shape {coords.shape}.")
+    return coords
+
+def check_metric(metric: str) -> None:
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric '{metric}'. Valid metrics are: {METRICS}.")
+
+def haversine_numpy(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    lon1, lat1, lon2, lat2 = np.radians(a[..., 0]), np.radians(a[..., 1]), np.radians(b[..., 0]), np.radians(b[..., 1])
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.minimum(np.sqrt(h), 1.0))
+
+def planar_numpy(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return np.sqrt(((a - b) ** 2).sum(axis=-1))
+
+def point_to_point_distance_numpy(a: np.ndarray, b: np.ndarray, metric: str) -> np.ndarray:
+    return haversine_numpy(a, b) if metric == 'haversine' else planar_numpy(a, b)
+
+def nearest_point_numpy(a: np.ndarray, b: np.ndarray, metric: str) -> tuple[np.ndarray, np.ndarray]:
+    indices = np.empty(len(a), dtype=np.int64)
+    distances = np.empty(len(a), dtype=np.float64)
+    for start in range(0, len(a), NEAREST_CHUNK_SIZE):
+        chunk = a[start:start + NEAREST_CHUNK_SIZE]
+        pairwise = point_to_point_distance_numpy(chunk[:, None, :], b[None, :, :], metric)
+        indices[start:start + len(chunk)] = pairwise.argmin(axis=1)
+        distances[start:start + len(chunk)] = pairwise[np.arange(len(chunk)), indices[start:start + len(chunk)]]
+    return indices, distances
+
+def point_to_linestring_distance_numpy(points: np.ndarray, linestring: np.ndarray) -> np.ndarray:
+    starts, ends = linestring[:-1], linestring[1:]
+    distances = np.full(len(points), np.inf)
+    for segment_start, segment_end in zip(starts, ends):
+        segment = segment_end - segment_start
+        length_squared = segment @ segment
+        t = np.clip(((points - segment_start) @ segment) / length_squared, 0.0, 1.0) if length_squared > 0 else np.zeros(len(points))
+        np.minimum(distances, np.sqrt(((points - segment_start - t[:, None] * segment) ** 2).sum(axis=1)), out=distances)
+    return distances
+
+def point_to_point_distance(a, b, metric: str = 'planar') -> np.ndarray:
+    """Distance in metres between row i of a and row i of b.
+
+    a and b are N×2 or N×3 arrays. 'planar' is the Euclidean distance in a projected system such as
+    UTM33 (EPSG:25833/5973), including height if there are three columns. 'haversine' is the great
+    circle distance between (longitude, latitude) in degrees, ignoring height.
+    """
+    check_metric(metric)
+    a, b = as_coordinates(a, "a"), as_coordinates(b, "b")
+    if a.shape != b.shape:
+        raise ValueError(f"a and b must have the same shape, got {a.shape} and {b.shape}.")
+    if nvdb_rust is not None:
+        return nvdb_rust.point_to_point_distance(a, b, metric)
+    return point_to_point_distance_numpy(a, b, metric)
+
+def nearest_point(a, b, metric: str = 'planar') -> tuple[np.ndarray, np.ndarray]:
+    """For every row of a, the index of the nearest row of b and the distance to it. Metrics as point_to_point_distance."""
+    check_metric(metric)
+    a, b = as_coordinates(a, "a"), as_coordinates(b, "b")
+    if a.shape[1] != b.shape[1] or len(b) == 0:
+        raise ValueError("b must be non-empty and have as many columns as a.")
+    if nvdb_rust is not None:
+        return nvdb_rust.nearest_point(a, b, metric)
+    return nearest_point_numpy(a, b, metric)
+
+def point_to_linestring_distance(points, linestring) -> np.ndarray:
+    """Planar distance from every row of points to the linestring through the rows of linestring, e.g. shapely.get_coordinates of a road segment."""
+    points, linestring = as_coordinates(points, "points"), as_coordinates(linestring, "linestring")
+    if points.shape[1] != linestring.shape[1] or len(linestring) < 2:
+        raise ValueError("linestring needs at least two points and as many columns as points.")
+    if nvdb_rust is not None:
+        return nvdb_rust.point_to_linestring_distance(points, linestring)
+    return point_to_linestring_distance_numpy(points, linestring)
+
+def benchmark(n: int = 1_000_000, m: int = 2_000, repeat: int = 3) -> dict[str, dict[str, float]]:
+    """Seconds per call for the Rust kernel and the NumPy fallback on random UTM33 coordinates, best of repeat."""
+    rng = np.random.default_rng(0)
+    a = as_coordinates(np.column_stack([rng.uniform(-100000, 1100000, n), rng.uniform(6400000, 7950000, n)]))
+    b = as_coordinates(np.column_stack([rng.uniform(-100000, 1100000, n), rng.uniform(6400000, 7950000, n)]))
+    degrees = as_coordinates(np.column_stack([rng.uniform(4, 31, n), rng.uniform(57, 72, n)]))
+    cases = {
+        'planar': (lambda: point_to_point_distance_numpy(a, b, 'planar'), lambda: nvdb_rust.point_to_point_distance(a, b, 'planar')),
+        'haversine': (lambda: point_to_point_distance_numpy(degrees, degrees[::-1].copy(), 'haversine'), lambda: nvdb_rust.point_to_point_distance(degrees, degrees[::-1].copy(), 'haversine')),
+        'nearest': (lambda: nearest_point_numpy(a[:m * 10], b[:m], 'planar'), lambda: nvdb_rust.nearest_point(a[:m * 10], b[:m], 'planar')),
+        'linestring': (lambda: point_to_linestring_distance_numpy(a[:n // 10], b[:m // 10]), lambda: nvdb_rust.point_to_linestring_distance(a[:n // 10], b[:m // 10])),
+    }
+    results : dict[str, dict[str, float]] = {}
+    for name, (numpy_function, rust_function) in cases.items():
+        results[name] = {}
+        for backend, function in (('numpy', numpy_function), ('rust', rust_function)):
+            if backend == 'rust' and nvdb_rust is None:
+                continue
+            timings = []
+            for _ in range(repeat):
+                start_time = time.perf_counter()
+                function()
+                timings.append(time.perf_counter() - start_time)
+            results[name][backend] = min(timings)
+        print(name + ": " + ", ".join(f"{backend} {seconds:.3f} s" for backend, seconds in results[name].items()))
+    return results
+
+if __name__ == "__main__":
+    if nvdb_rust is None:
+        print("nvdb_rust is not built, only timing the NumPy fallback. Build it with: maturin develop --release -m rust/Cargo.toml")
+    benchmark()
@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+import shapely
+from shapely import STRtree
+from ..geometry_conversions.geometry_arrays import to_geometry_array
+
+OBJECT_GEOMETRY_COLUMNS : list[str] = ['Geometri', 'geometri.wkt', 'lokasjon.geometri.wkt']
+SEGMENT_ID_COLUMNS : list[str] = ['veglenkesekvensid', 'startposisjon', 'sluttposisjon']
+
+class SegmentIndex:
+    """Bulk-loaded R-tree (shapely STRtree) over road segment geometries, e.g. RoadNetworkDownloader.road_segments.
+
+    The tree is built once and answers whole columns of object geometries per call, so matching objects to
+    a national network is a few vectorized queries instead of loops over the geometries. Every query returns
+    a flat frame with one row per match: the object's index label, the segment's index label and id columns,
+    the distance, the closest point on the segment (x, y), its fraction along the segment and, when the
+    segments have startposisjon and sluttposisjon, the relative position on the veglenkesekvens.
+
+    Example:
+        index = SegmentIndex(road_network.road_segments)
+        matches = index.nearest(feature_type.objects['Geometri'], max_distance=5)
+    """
+    def __init__(self, segments: pd.DataFrame, geometry_column: str = 'geometri.wkt', id_columns: list[str]|None = None) -> None:
+        geometries = to_geometry_array(segments[geometry_column])
+        present = ~shapely.is_missing(geometries)
+        self.rows : np.ndarray = np.flatnonzero(present) # Position in segments of every geometry in the tree
+        self.geometries : np.ndarray = geometries[present]
+        self.labels : np.ndarray = segments.index.to_numpy()[self.rows]
+        self.id_columns : list[str] = [col for col in (id_columns if id_columns is not None else SEGMENT_ID_COLUMNS) if col in segments.columns]
+        self.ids : pd.DataFrame = segments[self.id_columns].iloc[self.rows].reset_index(drop=True)
+        self.tree = STRtree(self.geometries)
+
+    def __len__(self) -> int:
+        return len(self.geometries)
+
+    def matches(self, object_labels: np.ndarray, object_geometries: np.ndarray, tree_indices: np.ndarray, distances: np.ndarray|None = None) -> pd.DataFrame:
+        """Flat frame of matches between object_geometries and the tree geometries at tree_indices."""
+        segments = self.geometries[tree_indices]
+        # The closest point on the segment is the start of the shortest line from the segment to the object.
+        closest = shapely.get_point(shapely.shortest_line(segments, object_geometries), 0)
+        if distances is None:
+            distances = shapely.distance(segments, object_geometries)
+        lengths = shapely.length(segments)
+        fractions = np.divide(shapely.line_locate_point(segments, closest), lengths, out=np.zeros(len(segments)), where=lengths > 0)
+        result = pd.DataFrame({
+            'object_index': object_labels,
+            'segment_index': self.labels[tree_indices],
+        })
+        result = pd.concat([result, self.ids.iloc[tree_indices].reset_index(drop=True)], axis=1)
+        result['distance'] = distances
+        result['x'] = shapely.get_x(closest)
+        result['y'] = shapely.get_y(closest)
+        result['fraction'] = fractions
+        if 'startposisjon' in result.columns and 'sluttposisjon' in result.columns:
+            result['posisjon'] = result['startposisjon'] + fractions * (result['sluttposisjon'] - result['startposisjon'])
+        return result
+
+    def nearest(self, geometries, max_distance: float|None = None) -> pd.DataFrame:
+        """The nearest segment of every geometry, leaving out geometries with no segment within max_distance. Ties keep the first segment."""
+        labels, objects = object_arrays(geometries)
+        present = np.flatnonzero(~shapely.is_missing(objects))
+        (object_positions, tree_indices), distances = self.tree.query_nearest(objects[present], max_distance=max_distance, return_distance=True, all_matches=False)
+        object_positions = present[object_positions]
+        return self.matches(labels[object_positions], objects[object_positions], tree_indices, distances)
+
+    def k_nearest(self, geometries, k: int, max_distance: float) -> pd.DataFrame:
+        """Up to k segments within max_distance of every geometry, nearest first.
+
+        max_distance bounds the search, so each geometry only compares against the segments the tree finds near it.
+        """
+        labels, objects = object_arrays(geometries)
+        object_positions, tree_indices = self.tree.query(objects, predicate='dwithin', distance=max_distance)
+        distances = shapely.distance(self.geometries[tree_indices], objects[object_positions])
+        order = np.lexsort((distances, object_positions))
+        object_positions, tree_indices, distances = object_positions[order], tree_indices[order], distances[order]
+        # Rank within each object, the candidates of one object being consecutive after the sort.
+        group_starts = np.flatnonzero(np.r_[True, object_positions[1:] != object_positions[:-1]])
+        ranks = np.arange(len(object_positions)) - np.repeat(group_starts, np.diff(np.r_[group_starts, len(object_positions)]))
+        keep = ranks < k
+        result = self.matches(labels[object_positions[keep]], objects[object_positions[keep]], tree_indices[keep], distances[keep])
+        result.insert(2, 'rank', ranks[keep])
+        return result
+
+    def bbox(self, boxes) -> pd.DataFrame:
+        """Segments intersecting each bounding box. boxes is one (min_x, min_y, max_x, max_y) or an N×4 array of them.
+
+        Returns one row per box and segment with the box number and the segment's index label and id columns.
+        """
+        boxes = np.atleast_2d(np.asarray(boxes, dtype=np.float64))
+        box_positions, tree_indices = self.tree.query(shapely.box(boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]), predicate='intersects')
+        result = pd.DataFrame({'box': box_positions, 'segment_index': self.labels[tree_indices]})
+        return pd.concat([result, self.ids.iloc[tree_indices].reset_index(drop=True)], axis=1)
+
+def object_arrays(geometries) -> tuple[np.ndarray, np.ndarray]:
+    """Index labels and shapely geometries of a geometry column, a GeoSeries or an array of geometries."""
+    labels = geometries.index.to_numpy() if isinstance(geometries, pd.Series) else np.arange(len(geometries))
+    return labels, to_geometry_array(geometries)
+
+def match_objects_to_segments(objects: pd.DataFrame, road_segments: pd.DataFrame, max_distance: float = 5.0, geometry_column: str|None = None) -> pd.DataFrame:
+    """The nearest road segment within max_distance (metres in UTM33) of every object, see SegmentIndex.nearest.
+
+    objects is e.g. FeatureTypeDownloader.objects, raw or populated, and road_segments RoadNetworkDownloader.road_segments.
+    """
+    if geometry_column is None:
+        geometry_column = next((col for col in OBJECT_GEOMETRY_COLUMNS if col in objects.columns), None)
+        if geometry_column is None:
+            raise KeyError(f"Found no geometry column in the objects, expected one of: {OBJECT_GEOMETRY_COLUMNS}.")
+    return SegmentIndex(road_segments).nearest(objects[geometry_column], max_distance=max_distance)
@@ -1 +1,2 @@
-from .linestring_to_polygon import linestring_to_polygon
\ No newline at end of file
+from .linestring_to_polygon import linestring_to_polygon, linestrings_to_polygons
+from .linestring_to_point import linestring_to_point, linestrings_to_points
\ No newline at end of file
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+def to_geometry_array(geometries) -> np.ndarray:
+    """Convert a GeoSeries, a Series of WKT text (e.g. the downloaded Geometri column), a list or an array to a numpy array of shapely geometries.
+
+    Missing and unparsable values become None.
+    """
+    if isinstance(geometries, gpd.GeoSeries):
+        return geometries.to_numpy(dtype=object)
+    values = np.array(geometries.to_numpy(dtype=object) if isinstance(geometries, pd.Series) else geometries, dtype=object)
+    values[pd.isna(values)] = None
+    is_text = np.array([isinstance(value, str) for value in values], dtype=bool)
+    if is_text.any():
+        values[is_text] = shapely.from_wkt(values[is_text], on_invalid='ignore')
+    return values
+
+def like_input(result: np.ndarray, geometries):
+    """Return result as a GeoSeries with the index and CRS of geometries if that was a Series, otherwise as the array."""
+    if isinstance(geometries, pd.Series):
+        return gpd.GeoSeries(result, index=geometries.index, crs=getattr(geometries, 'crs', None))
+    return result
+
+def linestring_reasons(geometries: np.ndarray, min_points: int) -> np.ndarray:
+    """Reason code per geometry for why it is not a usable LineString, 'ok' if it is."""
+    reasons = np.full(len(geometries), 'ok', dtype=object)
+    missing = shapely.is_missing(geometries)
+    not_linestring = ~missing & (shapely.get_type_id(geometries) != shapely.GeometryType.LINESTRING)
+    too_few_points = ~missing & ~not_linestring & (shapely.get_num_coordinates(geometries) < min_points)
+    reasons[missing] = 'missing'
+    reasons[not_linestring] = 'not_linestring'
+    reasons[too_few_points] = 'too_few_points'
+    return reasons
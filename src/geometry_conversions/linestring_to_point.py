@@ -1,4 +1,9 @@
+import numpy as np
+import shapely
 from shapely import LineString, Point, wkt
+from .geometry_arrays import like_input, linestring_reasons, to_geometry_array
+
+POINT_METHODS : list[str] = ['geographical_center', 'center_point', 'start_point', 'end_point']
 
 def linestring_to_point(linestring : LineString, method : str = 'geographical_center') -> Point|None:
     """Convert a linestring to a Point
@@ -59,6 +64,42 @@ def linestring_to_point(linestring : LineString, method : str = 'geographical_ce
     
     return method_functions[method](linestring)
 
+def linestrings_to_points(linestrings, method : str = 'geographical_center') -> tuple[np.ndarray, np.ndarray]:
+    """Convert many linestrings to Points
+
+    Array version of linestring_to_point, using shapely's vectorized functions instead of a loop over the geometries.
+    
+    Parameters
+    ----------
+    linestrings : GeoSeries, Series of WKT, list or array
+        The input LineString geometries, e.g. a downloaded Geometri column.
+    method : str, default='geographical_center'
+        The method to use for conversion. Options are 'geographical_center', 'center_point', 'start_point', 'end_point'.
+
+    Returns
+    -------
+    GeoSeries or array
+        The resulting Point geometries, None where the conversion failed. A GeoSeries with the same index and CRS if the input was a Series.
+    array
+        Reason code per row: 'ok', 'missing', 'not_linestring' or 'too_few_points'.
+    """
+    if method not in POINT_METHODS:
+        raise ValueError(f"Method '{method}' is not recognized. Valid methods are: {POINT_METHODS}.")
+    geometries = to_geometry_array(linestrings)
+    reasons = linestring_reasons(geometries, min_points=2)
+    valid = reasons == 'ok'
+    points = np.full(len(geometries), None, dtype=object)
+    match method:
+        case 'geographical_center': # Without height, as linestring_to_point
+            points[valid] = shapely.centroid(geometries[valid])
+        case 'center_point':
+            points[valid] = shapely.line_interpolate_point(geometries[valid], shapely.length(geometries[valid]) / 2)
+        case 'start_point':
+            points[valid] = shapely.get_point(geometries[valid], 0)
+        case 'end_point':
+            points[valid] = shapely.get_point(geometries[valid], -1)
+    return like_input(points, linestrings), reasons
+
 if __name__ == "__main__":
     geom = "LINESTRING Z (233846.72 6691541.55 159.884,233844.97 6691542.54 159.874,233842.52 6691538.24 159.914,233844.24 6691537.26 159.874)"
     ls = wkt.loads(geom)
@@ -1,4 +1,7 @@
+import numpy as np
+import shapely
 from shapely import wkt, LineString, Polygon, distance, Point, geometry
+from .geometry_arrays import like_input, linestring_reasons, to_geometry_array
 
 def linestring_to_polygon(linestring: LineString, ring_threshold: float = 1.0) -> Polygon|None:
     """Converts a LineString to a Polygon.
@@ -43,6 +46,58 @@ def linestring_to_polygon(linestring: LineString, ring_threshold: float = 1.0) -
     polygon = Polygon(list(closed_linestring.coords))
     return polygon
 
+def linestrings_to_polygons(linestrings, ring_threshold: float = 1.0) -> tuple[np.ndarray, np.ndarray]:
+    """Converts many LineStrings to Polygons.
+
+    Array version of linestring_to_polygon, closing and checking every LineString with shapely's vectorized
+    functions instead of a loop over the geometries. The rules are the same: a LineString is closed by adding
+    its start point if the endpoints are within ring_threshold, and the closed ring needs at least 4 points
+    and must not be self-intersecting.
+    
+    Parameters
+    ----------
+    linestrings : GeoSeries, Series of WKT, list or array
+        The input LineString geometries, e.g. a downloaded Geometri column.
+    ring_threshold : float, default=1.0
+        The maximum distance between the start and end points to consider the LineString as closable.
+
+    Returns
+    -------
+    GeoSeries or array
+        The resulting Polygon geometries, None where the conversion failed. A GeoSeries with the same index and CRS if the input was a Series.
+    array
+        Reason code per row: 'ok', 'missing', 'not_linestring', 'too_few_points', 'endpoints_too_far' or 'not_simple'.
+    """
+    geometries = to_geometry_array(linestrings)
+    reasons = linestring_reasons(geometries, min_points=1)
+    polygons = np.full(len(geometries), None, dtype=object)
+    # 2D and 3D LineStrings are closed separately, so 2D rings do not get a missing Z.
+    has_z = shapely.has_z(geometries)
+    for include_z in (False, True):
+        rows = np.flatnonzero((reasons == 'ok') & (has_z == include_z))
+        if len(rows) == 0:
+            continue
+        coords, index = shapely.get_coordinates(geometries[rows], include_z=include_z, return_index=True)
+        counts = np.bincount(index, minlength=len(rows))
+        ends = np.cumsum(counts)
+        starts = ends - counts
+        needs_closing = (coords[starts] != coords[ends - 1]).any(axis=1)
+        too_far = needs_closing & (np.hypot(*(coords[starts, :2] - coords[ends - 1, :2]).T) > ring_threshold)
+        too_few_points = ~too_far & (counts + needs_closing < 4)
+        reasons[rows[too_far]] = 'endpoints_too_far'
+        reasons[rows[too_few_points]] = 'too_few_points'
+
+        closable = ~too_far & ~too_few_points
+        keep = np.repeat(closable, counts)
+        closing = needs_closing & closable
+        ring_coords = np.insert(coords, ends[closing], coords[starts[closing]], axis=0)[np.insert(keep, ends[closing], True)]
+        ring_index = np.repeat(np.arange(closable.sum()), (counts + closing)[closable])
+        rings = shapely.linearrings(ring_coords, indices=ring_index)
+        simple = shapely.is_simple(shapely.linestrings(ring_coords, indices=ring_index))
+        reasons[rows[closable][~simple]] = 'not_simple'
+        polygons[rows[closable][simple]] = shapely.polygons(rings[simple])
+    return like_input(polygons, linestrings), reasons
+
 if __name__ == "__main__":
     linje = "LINESTRING Z (56765.102 6457032.938 4.86,56763.365 6457032.507 4.97,56763.49 6457032.224 5.01,56763.661 6457031.877 4.97,56763.846 6457031.478 4.87,56768.383 6457033.599 4.89,56768.273 6457033.951 4.98,56768.088 6457034.35 5,56767.901 6457034.739 4.95,56767.693 6457035.119 4.83,56765.802 6457032.938 4.86)"
     ls = wkt.loads(linje)
@@ -0,0 +1,2 @@
+from .road_graph import RoadGraph
+from .linear_referencing import StedfestingIndex, parse_stedfestinger, overlaps, dynamic_segmentation
\ No newline at end of file
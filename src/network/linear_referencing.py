@@ -0,0 +1,169 @@
+import numpy as np
+import pandas as pd
+
+STEDFESTING_COLUMNS : list[str] = ['Stedfestinger', 'lokasjon.stedfestinger']
+ID_COLUMNS : list[str] = ['nvdbId', 'id']
+# Kortform of a stedfesting: 0.5@1234 for a point, 0.1-0.4@1234 for a line, optionally followed by the direction.
+KORTFORM_PATTERN : str = r'^\s*(?P<start>\d*\.?\d+)(?:\s*-\s*(?P<end>\d*\.?\d+))?\s*@\s*(?P<veglenkesekvensid>\d+)(?:\s+(?P<retning>\w+))?\s*$'
+GROUP_SPACING : float = 4.0 # Positions are relative, 0 to 1, so every veglenkesekvens gets its own range of the search keys
+
+def parse_stedfestinger(objects: pd.DataFrame, column: str|None = None) -> pd.DataFrame:
+    """One row per stedfesting of the objects, in compact columns.
+
+    Reads the kortform strings of populated frames (Stedfestinger) or the raw stedfesting dicts of unpopulated
+    frames (lokasjon.stedfestinger). Returns object (the object's index label), nvdbId, veglenkesekvensid (int64),
+    start and end (float64, equal for point stedfestinger), retning and sideposisjon (categorical, when known).
+    """
+    if column is None:
+        column = next((col for col in STEDFESTING_COLUMNS if col in objects.columns), None)
+        if column is None:
+            raise KeyError(f"Found no stedfesting column in the objects, expected one of: {STEDFESTING_COLUMNS}.")
+    id_column : str|None = next((col for col in ID_COLUMNS if col in objects.columns), None)
+    exploded = pd.DataFrame({
+        'object': objects.index,
+        'nvdbId': objects[id_column].to_numpy() if id_column else pd.NA,
+        'stedfesting': objects[column].to_numpy()
+    }).explode('stedfesting', ignore_index=True).dropna(subset=['stedfesting'])
+
+    is_text = exploded['stedfesting'].map(lambda value: isinstance(value, str)).to_numpy(dtype=bool)
+    parts : list[pd.DataFrame] = []
+    if is_text.any():
+        text = exploded[is_text]
+        parsed = text['stedfesting'].str.extract(KORTFORM_PATTERN)
+        parts.append(pd.DataFrame({
+            'object': text['object'].to_numpy(),
+            'nvdbId': text['nvdbId'].to_numpy(),
+            'veglenkesekvensid': parsed['veglenkesekvensid'].to_numpy(),
+            'start': parsed['start'].to_numpy(),
+            'end': parsed['end'].fillna(parsed['start']).to_numpy(),
+            'retning': parsed['retning'].to_numpy(),
+            'sideposisjon': None,
+        }))
+    if (~is_text).any():
+        records = exploded[~is_text]
+        stedfestinger = records['stedfesting'].tolist()
+        def field(key: str, fallback: str|None = None) -> list:
+            return [stedfesting.get(key, stedfesting.get(fallback) if fallback else None) if isinstance(stedfesting, dict) else None for stedfesting in stedfestinger]
+        parts.append(pd.DataFrame({
+            'object': records['object'].to_numpy(),
+            'nvdbId': records['nvdbId'].to_numpy(),
+            'veglenkesekvensid': field('veglenkesekvensid'),
+            'start': field('startposisjon', 'relativPosisjon'),
+            'end': field('sluttposisjon', 'relativPosisjon'),
+            'retning': field('retning'),
+            'sideposisjon': field('sideposisjon'),
+        }))
+    if not parts:
+        return pd.DataFrame({
+            'object': pd.Series(dtype=objects.index.dtype), 'nvdbId': pd.Series(dtype='Int64'), 'veglenkesekvensid': pd.Series(dtype='int64'),
+            'start': pd.Series(dtype='float64'), 'end': pd.Series(dtype='float64'), 'retning': pd.Categorical([]), 'sideposisjon': pd.Categorical([])
+        })
+    result = pd.concat(parts, ignore_index=True).dropna(subset=['veglenkesekvensid', 'start', 'end'])
+    result = result.astype({'veglenkesekvensid': 'int64', 'start': 'float64', 'end': 'float64', 'retning': 'category', 'sideposisjon': 'category'})
+    if id_column:
+        result['nvdbId'] = result['nvdbId'].astype('Int64')
+    return result.reset_index(drop=True)
+
+class StedfestingIndex:
+    """Interval index over parsed stedfestinger (see parse_stedfestinger), per veglenkesekvens.
+
+    The stedfestinger are sorted on veglenkesekvens and start, with the running maximum of end within each
+    veglenkesekvens. Both are monotonic search keys, so the candidates for a query are one contiguous range
+    found by binary search, and whole arrays of queries are answered at once.
+
+    Example:
+        index = StedfestingIndex(parse_stedfestinger(speed_limits.objects))
+        index.stab([1234, 1234], [0.25, 0.75])
+    """
+    def __init__(self, stedfestinger: pd.DataFrame) -> None:
+        # Reversed line stedfestinger have start > end, the index works on the covered range.
+        low = np.minimum(stedfestinger['start'].to_numpy(dtype=np.float64), stedfestinger['end'].to_numpy(dtype=np.float64))
+        high = np.maximum(stedfestinger['start'].to_numpy(dtype=np.float64), stedfestinger['end'].to_numpy(dtype=np.float64))
+        sequences = stedfestinger['veglenkesekvensid'].to_numpy(dtype=np.int64)
+        order = np.lexsort((low, sequences))
+        self.stedfestinger : pd.DataFrame = stedfestinger.iloc[order].reset_index(drop=True)
+        self.start : np.ndarray = low[order]
+        self.end : np.ndarray = high[order]
+        self.sequence_ids, groups = np.unique(sequences[order], return_inverse=True)
+        running_end = np.maximum.accumulate(self.end + groups * GROUP_SPACING) # The group offset restarts the maximum at every veglenkesekvens
+        self.start_keys : np.ndarray = self.start + groups * GROUP_SPACING
+        self.end_keys : np.ndarray = running_end
+
+    def __len__(self) -> int:
+        return len(self.start)
+
+    def candidates(self, veglenkesekvensid, start, end) -> tuple[np.ndarray, np.ndarray]:
+        """Query numbers and stedfesting rows of every stedfesting overlapping the query ranges, touching ends included."""
+        veglenkesekvensid = np.atleast_1d(np.asarray(veglenkesekvensid, dtype=np.int64))
+        start, end = np.broadcast_to(np.atleast_1d(np.asarray(start, dtype=np.float64)), veglenkesekvensid.shape), np.broadcast_to(np.atleast_1d(np.asarray(end, dtype=np.float64)), veglenkesekvensid.shape)
+        low, high = np.minimum(start, end), np.maximum(start, end)
+        groups = np.searchsorted(self.sequence_ids, veglenkesekvensid)
+        known = (groups < len(self.sequence_ids)) & (self.sequence_ids[np.minimum(groups, len(self.sequence_ids) - 1)] == veglenkesekvensid) if len(self.sequence_ids) else np.zeros(len(groups), dtype=bool)
+        first = np.searchsorted(self.end_keys, low + groups * GROUP_SPACING, side='left') # First row whose running end reaches the query
+        last = np.searchsorted(self.start_keys, high + groups * GROUP_SPACING, side='right') # Rows after this start past the query
+        counts = np.where(known, np.maximum(last - first, 0), 0)
+        queries = np.repeat(np.arange(len(veglenkesekvensid)), counts)
+        rows = np.repeat(first - np.r_[0, np.cumsum(counts)[:-1]], counts) + np.arange(counts.sum())
+        keep = self.end[rows] >= low[queries]
+        return queries[keep], rows[keep]
+
+    def overlap(self, veglenkesekvensid, start, end) -> pd.DataFrame:
+        """Stedfestinger overlapping each query range, one row per query and stedfesting with the query number in 'query'."""
+        queries, rows = self.candidates(veglenkesekvensid, start, end)
+        result = self.stedfestinger.iloc[rows].reset_index(drop=True)
+        result.insert(0, 'query', queries)
+        return result
+
+    def stab(self, veglenkesekvensid, posisjon) -> pd.DataFrame:
+        """Stedfestinger covering each position, e.g. which objects of a type cover position p on veglenkesekvens Y."""
+        return self.overlap(veglenkesekvensid, posisjon, posisjon)
+
+def overlaps(a: pd.DataFrame, b: pd.DataFrame, suffixes: tuple[str, str] = ('_a', '_b')) -> pd.DataFrame:
+    """Every pair of overlapping stedfestinger between two parsed types, with the shared range and its relative length."""
+    index = StedfestingIndex(b)
+    queries, rows = index.candidates(a['veglenkesekvensid'], a['start'], a['end'])
+    left = a.iloc[queries].reset_index(drop=True)
+    right = index.stedfestinger.iloc[rows].reset_index(drop=True)
+    result = pd.concat([left.add_suffix(suffixes[0]), right.drop(columns=['veglenkesekvensid']).add_suffix(suffixes[1])], axis=1)
+    result = result.rename(columns={f'veglenkesekvensid{suffixes[0]}': 'veglenkesekvensid'})
+    result['overlap_start'] = np.maximum(np.minimum(left['start'], left['end']), index.start[rows])
+    result['overlap_end'] = np.minimum(np.maximum(left['start'], left['end']), index.end[rows])
+    result['overlap_length'] = result['overlap_end'] - result['overlap_start']
+    return result
+
+def dynamic_segmentation(stedfestinger: dict[str, pd.DataFrame]) -> pd.DataFrame:
+    """Split the veglenkesekvenser at every start and end of the given types and list what covers each piece.
+
+    stedfestinger maps a name (e.g. the feature type) to its parsed stedfestinger. Returns one row per piece with
+    veglenkesekvensid, start and end, and per name the nvdbIds covering the piece. Pieces covered by none are left out.
+    Point stedfestinger get a zero-length piece at their position, listing the points and the lines reaching it.
+    """
+    indexes : dict[str, StedfestingIndex] = {name: StedfestingIndex(frame) for name, frame in stedfestinger.items()}
+    breakpoints = pd.DataFrame({
+        'veglenkesekvensid': np.concatenate([np.repeat(index.stedfestinger['veglenkesekvensid'].to_numpy(dtype=np.int64), 2) for index in indexes.values()]),
+        'posisjon': np.concatenate([np.column_stack([index.start, index.end]).ravel() for index in indexes.values()]),
+    }).drop_duplicates().sort_values(['veglenkesekvensid', 'posisjon'], ignore_index=True)
+    same_sequence = breakpoints['veglenkesekvensid'].to_numpy()[1:] == breakpoints['veglenkesekvensid'].to_numpy()[:-1]
+    points = pd.DataFrame({
+        'veglenkesekvensid': np.concatenate([index.stedfestinger['veglenkesekvensid'].to_numpy(dtype=np.int64)[index.start == index.end] for index in indexes.values()]),
+        'posisjon': np.concatenate([index.start[index.start == index.end] for index in indexes.values()]),
+    }).drop_duplicates()
+    pieces = pd.concat([
+        pd.DataFrame({
+            'veglenkesekvensid': breakpoints['veglenkesekvensid'].to_numpy()[:-1][same_sequence],
+            'start': breakpoints['posisjon'].to_numpy()[:-1][same_sequence],
+            'end': breakpoints['posisjon'].to_numpy()[1:][same_sequence],
+        }),
+        # Points are breakpoints, so they never fall inside a piece, only at its ends.
+        pd.DataFrame({'veglenkesekvensid': points['veglenkesekvensid'].to_numpy(), 'start': points['posisjon'].to_numpy(), 'end': points['posisjon'].to_numpy()}),
+    ]).sort_values(['veglenkesekvensid', 'start', 'end'], ignore_index=True)
+    middles = (pieces['start'].to_numpy() + pieces['end'].to_numpy()) / 2
+    covered = np.zeros(len(pieces), dtype=bool)
+    for name, index in indexes.items():
+        queries, rows = index.candidates(pieces['veglenkesekvensid'].to_numpy(), middles, middles)
+        # candidates returns the queries in order, so the ids of each piece are one slice of ids.
+        ids = index.stedfestinger['nvdbId'].to_numpy()[rows].tolist()
+        bounds = np.searchsorted(queries, np.arange(len(pieces) + 1)).tolist()
+        pieces[name] = [ids[bounds[piece]:bounds[piece + 1]] for piece in range(len(pieces))]
+        covered[queries] = True
+    return pieces[covered].reset_index(drop=True)
@@ -0,0 +1,233 @@
+import heapq
+import numpy as np
+import pandas as pd
+import networkx as nx
+
+CATEGORY_COLUMN : str = 'vegsystemreferanse.vegsystem.vegkategori'
+LANES_COLUMN : str = 'feltoversikt' # Lane codes of the segment, e.g. ['1', '2'] or ['1', '3K']
+DIRECTION_COLUMN : str = 'vegsystemreferanse.strekning.retning' # MED if the metering runs from startnode to sluttnode, MOT if against
+MAX_NETWORKX_NODES : int = 100_000 # A networkx graph costs around a kilobyte per node and edge, export larger graphs in parts
+
+class RoadGraph:
+    """Road network graph in CSR arrays, built from RoadNetworkDownloader.road_segments.
+
+    Nodes are the startnode/sluttnode ids of the segments, renumbered to int32. The edges from node u are
+    indices[indptr[u]:indptr[u + 1]], with their length in weights and the index label of their first
+    segment in edge_segments. Segments of the same veglenke between the same nodes are one edge with the
+    summed length. Each edge is stored in the directions it can be travelled, see travel_directions. A
+    national network takes some tens of bytes per edge, instead of the kilobytes per edge of a networkx graph.
+
+    Example:
+        graph = RoadGraph(road_network.road_segments)
+        length, nodes, segments = graph.shortest_path('1234', '5678', categories=['E', 'R'])
+    """
+    def __init__(self, segments: pd.DataFrame, length_column: str = 'lengde') -> None:
+        segments = segments.dropna(subset=['startnode', 'sluttnode'])
+        group_columns : list[str] = [col for col in ['veglenkesekvensid', 'veglenkenummer'] if col in segments.columns] + ['startnode', 'sluttnode']
+        forward, backward = travel_directions(segments)
+        edges = segments.assign(segment=segments.index, forward=forward, backward=backward).groupby(group_columns, sort=False, dropna=False).agg(
+            length=(length_column, 'sum'),
+            segment=('segment', 'first'),
+            forward=('forward', 'all'), # An edge can be travelled one way only if all its segments can
+            backward=('backward', 'all'),
+            **({'category': (CATEGORY_COLUMN, 'first')} if CATEGORY_COLUMN in segments.columns else {})
+        ).reset_index()
+
+        codes, self.node_ids = pd.factorize(pd.concat([edges['startnode'], edges['sluttnode']], ignore_index=True).astype(str))
+        starts, ends = codes[:len(edges)].astype(np.int32), codes[len(edges):].astype(np.int32)
+        edge_numbers = np.arange(len(edges), dtype=np.int32)
+        forward, backward = edges['forward'].to_numpy(dtype=bool), edges['backward'].to_numpy(dtype=bool)
+        # startnode -> sluttnode for the edges that can be travelled forward, sluttnode -> startnode for those that can be travelled backward.
+        sources = np.concatenate([starts[forward], ends[backward]])
+        targets = np.concatenate([ends[forward], starts[backward]])
+        edge_numbers = np.concatenate([edge_numbers[forward], edge_numbers[backward]])
+        order = np.argsort(sources, kind='stable')
+
+        self.indptr : np.ndarray = np.zeros(len(self.node_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=len(self.node_ids)), out=self.indptr[1:])
+        self.indices : np.ndarray = targets[order]
+        self.edge_numbers : np.ndarray = edge_numbers[order] # Row in the edge arrays below, shared by both directions of a two-way edge
+        self.weights : np.ndarray = edges['length'].to_numpy(dtype=np.float64)[self.edge_numbers]
+        self.edge_segments : np.ndarray = edges['segment'].to_numpy()
+        self.edge_categories : pd.Categorical|None = pd.Categorical(edges['category']) if 'category' in edges.columns else None
+
+    @property
+    def number_of_nodes(self) -> int:
+        return len(self.node_ids)
+
+    @property
+    def number_of_edges(self) -> int:
+        return len(self.edge_segments)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = [self.indptr, self.indices, self.edge_numbers, self.weights, self.edge_segments]
+        category_bytes : int = self.edge_categories.codes.nbytes if self.edge_categories is not None else 0
+        return sum(array.nbytes for array in arrays) + category_bytes + int(self.node_ids.memory_usage(deep=True))
+
+    def node(self, node_id) -> int:
+        """The int32 node number of a startnode/sluttnode id."""
+        number = self.node_ids.get_indexer([str(node_id)])[0]
+        if number < 0:
+            raise KeyError(f"Node {node_id} is not in the graph.")
+        return int(number)
+
+    def edge_mask(self, categories: list[str]|None) -> np.ndarray|None:
+        """Which CSR entries may be travelled when only roads of the given categories are allowed. None allows all."""
+        if categories is None:
+            return None
+        if self.edge_categories is None:
+            raise KeyError(f"The segments had no {CATEGORY_COLUMN} column to filter on.")
+        allowed_codes = self.edge_categories.categories.get_indexer(categories)
+        return np.isin(self.edge_categories.codes, allowed_codes[allowed_codes >= 0])[self.edge_numbers]
+
+    def dijkstra(self, source, target=None, max_distance: float = np.inf, categories: list[str]|None = None) -> tuple[np.ndarray, np.ndarray]:
+        """Shortest distance from source to every node, inf where unreachable, and the CSR entry each node was reached by (-1 for none).
+
+        Stops early when target is reached and does not search past max_distance.
+        """
+        mask = self.edge_mask(categories)
+        start, goal = self.node(source), (self.node(target) if target is not None else -1)
+        distances = np.full(self.number_of_nodes, np.inf)
+        reached_by = np.full(self.number_of_nodes, -1, dtype=np.int64)
+        distances[start] = 0.0
+        queue : list[tuple[float, int]] = [(0.0, start)]
+        while queue:
+            distance, node = heapq.heappop(queue)
+            if distance > distances[node]:
+                continue
+            if node == goal:
+                break
+            entries = np.arange(self.indptr[node], self.indptr[node + 1])
+            if mask is not None:
+                entries = entries[mask[entries]]
+            new_distances = distance + self.weights[entries]
+            better = (new_distances < distances[self.indices[entries]]) & (new_distances <= max_distance)
+            for entry, neighbour, new_distance in zip(entries[better].tolist(), self.indices[entries[better]].tolist(), new_distances[better].tolist()):
+                if new_distance < distances[neighbour]: # The same neighbour can be listed twice, through parallel edges
+                    distances[neighbour] = new_distance
+                    reached_by[neighbour] = entry
+                    heapq.heappush(queue, (new_distance, neighbour))
+        return distances, reached_by
+
+    def shortest_path(self, source, target, categories: list[str]|None = None) -> tuple[float, list, list]:
+        """Length, node ids and segment index labels of the shortest path from source to target. (inf, [], []) if there is none."""
+        distances, reached_by = self.dijkstra(source, target, categories=categories)
+        goal = self.node(target)
+        if np.isinf(distances[goal]):
+            return float('inf'), [], []
+        # The source node of every CSR entry, to walk the path back from target.
+        entry_sources = np.repeat(np.arange(self.number_of_nodes, dtype=np.int32), np.diff(self.indptr))
+        nodes, segments = [goal], []
+        while reached_by[nodes[-1]] >= 0:
+            entry = reached_by[nodes[-1]]
+            segments.append(self.edge_segments[self.edge_numbers[entry]])
+            nodes.append(int(entry_sources[entry]))
+        return float(distances[goal]), self.node_ids[nodes[::-1]].tolist(), segments[::-1]
+
+    def reachable(self, source, max_distance: float|None = None, categories: list[str]|None = None) -> pd.Series:
+        """Node ids reachable from source, with their distance if max_distance is given."""
+        if max_distance is not None:
+            distances, _ = self.dijkstra(source, max_distance=max_distance, categories=categories)
+            nodes = np.flatnonzero(np.isfinite(distances))
+            return pd.Series(distances[nodes], index=self.node_ids[nodes], name='distance')
+        # Without a distance limit a breadth-first search over whole frontiers is enough.
+        mask = self.edge_mask(categories)
+        visited = np.zeros(self.number_of_nodes, dtype=bool)
+        frontier = np.array([self.node(source)], dtype=np.int64)
+        visited[frontier] = True
+        while len(frontier):
+            entries = csr_entries(self.indptr, frontier)
+            if mask is not None:
+                entries = entries[mask[entries]]
+            neighbours = np.unique(self.indices[entries])
+            frontier = neighbours[~visited[neighbours]]
+            visited[frontier] = True
+        nodes = np.flatnonzero(visited)
+        return pd.Series(np.nan, index=self.node_ids[nodes], name='distance')
+
+    def connected_components(self, categories: list[str]|None = None) -> pd.Series:
+        """Component number of every node id, 0 for the largest component. Components are weakly connected, one-way edges join their nodes too."""
+        sources = np.repeat(np.arange(self.number_of_nodes, dtype=np.int64), np.diff(self.indptr))
+        targets = self.indices.astype(np.int64)
+        mask = self.edge_mask(categories)
+        if mask is not None:
+            sources, targets = sources[mask], targets[mask]
+        labels = np.arange(self.number_of_nodes, dtype=np.int64)
+        while True:
+            # Hook the larger root of every edge with different roots to the smaller, then compress the trees.
+            source_labels, target_labels = labels[sources], labels[targets]
+            different = source_labels != target_labels
+            if not different.any():
+                break
+            np.minimum.at(labels, np.maximum(source_labels, target_labels)[different], np.minimum(source_labels, target_labels)[different])
+            while True:
+                compressed = labels[labels]
+                if np.array_equal(compressed, labels):
+                    break
+                labels = compressed
+        _, components, sizes = np.unique(labels, return_inverse=True, return_counts=True)
+        rank = np.empty(len(sizes), dtype=np.int32)
+        rank[np.argsort(-sizes, kind='stable')] = np.arange(len(sizes), dtype=np.int32)
+        return pd.Series(rank[components], index=self.node_ids, name='component')
+
+    def to_networkx(self, node_ids: list|None = None, max_nodes: int = MAX_NETWORKX_NODES) -> nx.MultiDiGraph:
+        """The subgraph of node_ids (all nodes if None) as a networkx graph, with length, segment and category on the edges.
+
+        Two-way edges become one networkx edge in each direction.
+
+        Refuses subgraphs larger than max_nodes, use reachable or connected_components to pick a part of the network first.
+        """
+        nodes = np.arange(self.number_of_nodes) if node_ids is None else self.node_ids.get_indexer([str(node_id) for node_id in node_ids])
+        nodes = nodes[nodes >= 0]
+        if len(nodes) > max_nodes:
+            raise ValueError(f"{len(nodes)} nodes is more than max_nodes={max_nodes}, export a smaller part of the network.")
+        included = np.zeros(self.number_of_nodes, dtype=bool)
+        included[nodes] = True
+        entries = csr_entries(self.indptr, nodes)
+        entries = entries[included[self.indices[entries]]]
+        sources = np.repeat(np.arange(self.number_of_nodes), np.diff(self.indptr))[entries]
+        edge_numbers = self.edge_numbers[entries]
+        graph = nx.MultiDiGraph()
+        graph.add_nodes_from(self.node_ids[nodes])
+        categories = np.asarray(self.edge_categories)[edge_numbers] if self.edge_categories is not None else [None] * len(edge_numbers)
+        graph.add_edges_from(
+            (source, target, {'length': length, 'segment': segment, 'category': category})
+            for source, target, length, segment, category in zip(self.node_ids[sources], self.node_ids[self.indices[entries]], self.weights[entries].tolist(), self.edge_segments[edge_numbers].tolist(), categories)
+        )
+        return graph
+
+def travel_directions(segments: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+    """Whether each segment can be travelled from startnode to sluttnode (forward) and from sluttnode to startnode (backward).
+
+    Odd lane numbers in feltoversikt carry traffic in the metering direction and even numbers against it, and
+    vegsystemreferanse.strekning.retning tells whether the metering runs along the segment (MED) or against it (MOT).
+    Segments without lanes, or without the columns, can be travelled both ways.
+    """
+    if LANES_COLUMN not in segments.columns:
+        both = np.ones(len(segments), dtype=bool)
+        return both, both.copy()
+    lanes = segments[LANES_COLUMN].reset_index(drop=True).explode()
+    # A network has few distinct lane codes, so the lane number is parsed once per code.
+    codes, uniques = pd.factorize(lanes.astype('string'))
+    numbers = pd.to_numeric(pd.Series(uniques).str.extract(r'^(\d+)', expand=False), errors='coerce').to_numpy(dtype=float)
+    parity = np.r_[numbers % 2, np.nan][codes] # Missing lanes get code -1, the nan at the end
+    rows = lanes.index.to_numpy()
+    with_metering = np.zeros(len(segments), dtype=bool)
+    against_metering = np.zeros(len(segments), dtype=bool)
+    with_metering[rows[parity == 1]] = True
+    against_metering[rows[parity == 0]] = True
+    if DIRECTION_COLUMN in segments.columns:
+        metering_backward = (segments[DIRECTION_COLUMN].astype('string') == 'MOT').fillna(False).to_numpy(dtype=bool)
+    else:
+        metering_backward = np.zeros(len(segments), dtype=bool)
+    forward = np.where(metering_backward, against_metering, with_metering)
+    backward = np.where(metering_backward, with_metering, against_metering)
+    unknown = ~(forward | backward) # No lane numbers
+    return forward | unknown, backward | unknown
+
+def csr_entries(indptr: np.ndarray, nodes: np.ndarray) -> np.ndarray:
+    """Positions in the CSR arrays of every edge from nodes."""
+    starts, ends = indptr[nodes], indptr[np.asarray(nodes) + 1]
+    counts = ends - starts
+    return np.repeat(starts - np.r_[0, np.cumsum(counts)[:-1]], counts) + np.arange(counts.sum())
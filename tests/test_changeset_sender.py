@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+import itertools
+import json
+import os
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.api.changesetSender import authenticate, submit_changesets
+
+STUB_TOKEN : str = "stub-id-token"
+POLLS_BEFORE_DONE : int = 2 # fremdrift answers BEHANDLES this many times before UTFØRT
+
+class StubHandler(BaseHTTPRequestHandler):
+    """The endpoints of the write API the submitter uses: authenticate, validator, register, start and fremdrift.
+
+    Changesets closing nvdbId -1 are rejected by the validator, and those closing nvdbId -2 are registered
+    without a fremdrift link. Everything else is accepted.
+    """
+    def log_message(self, *args) -> None:
+        pass
+
+    def send(self, status: int, body, content_type: str = "application/json") -> None:
+        data = (body if isinstance(body, str) else json.dumps(body, ensure_ascii=False)).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def authorized(self) -> bool:
+        if self.headers.get("Authorization") != f"Bearer {STUB_TOKEN}":
+            self.send(401, {"message": "Missing or wrong id token"})
+            return False
+        return True
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"null")
+        if self.path == "/rest/v1/oidc/authenticate":
+            if body.get("username") and body.get("password"):
+                return self.send(200, f"<authResponse><idToken>{STUB_TOKEN}</idToken></authResponse>", "application/xml")
+            return self.send(401, "<authResponse/>", "application/xml")
+        if not self.authorized():
+            return
+        if self.path == "/rest/v3/endringssett/validator":
+            rejected = any(obj.get("nvdbId") == -1 for obj in body.get("lukk", {}).get("vegobjekter", []))
+            return self.send(200, {"fremdrift": "AVVIST" if rejected else "UTFØRT", "avvistårsak": "Ukjent nvdbId -1" if rejected else None})
+        if self.path == "/rest/v3/endringssett":
+            number = next(self.server.numbers)
+            self.server.polls[number] = 0
+            url = f"http://127.0.0.1:{self.server.server_port}/rest/v3/endringssett/{number}"
+            links = [{"rel": "self", "src": url}, {"rel": "start", "src": url + "/start"}, {"rel": "fremdrift", "src": url + "/fremdrift"}]
+            if any(obj.get("nvdbId") == -2 for obj in body.get("lukk", {}).get("vegobjekter", [])):
+                links = links[:2]
+            return self.send(201, links)
+        if self.path.endswith("/start"):
+            return self.send(202, {})
+        self.send(404, {"message": "Unknown endpoint"})
+
+    def do_GET(self) -> None:
+        if not self.authorized():
+            return
+        number = int(self.path.split("/")[-2])
+        self.server.polls[number] += 1
+        self.send(200, "UTFØRT" if self.server.polls[number] > POLLS_BEFORE_DONE else "BEHANDLES")
+
+def start_stub() -> ThreadingHTTPServer:
+    """A stub of the write API on a free local port, served from a daemon thread. Its base URL is http://127.0.0.1:<server_port>/."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.numbers = itertools.count(1)
+    server.polls = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def write_changesets(directory: str, nvdb_ids: dict[str, int]) -> list[str]:
+    """One Lukk changeset file per name, closing the given nvdbId."""
+    paths = []
+    for name, nvdb_id in nvdb_ids.items():
+        paths.append(os.path.join(directory, f"{name}.json"))
+        with open(paths[-1], "w", encoding="utf-8") as fp:
+            json.dump({"lukk": {"vegobjekter": [{"typeId": 50, "nvdbId": nvdb_id, "versjon": 1, "lukkedato": "2024-01-01", "kaskadelukking": "NEI"}]}}, fp)
+    return paths
+
+class SubmitChangesetsTest(unittest.TestCase):
+    """Authentication and submission against the write API stub, run with: python -m unittest discover tests"""
+    def setUp(self) -> None:
+        self.server = start_stub()
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}/"
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def test_authenticate(self) -> None:
+        self.assertEqual(authenticate("bruker", "passord", "test", "stub", base_url=self.base_url), STUB_TOKEN)
+        self.assertEqual(authenticate("bruker", "", "test", "stub", base_url=self.base_url), "")
+
+    def test_submit_changesets(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            paths = write_changesets(directory, {"accepted": 1, "rejected": -1, "no_fremdrift": -2})
+            results = submit_changesets(paths, "test", STUB_TOKEN, "stub", dryrun=True, max_workers=3, base_url=self.base_url, poll_interval=0.05, timeout=60)
+        self.assertEqual([result["status"] for result in results], ["ok", "validate failed", "wait failed"])
+        self.assertEqual(results[0]["fremdrift"], "UTFØRT")
+        self.assertEqual(results[1]["avvistårsak"], "Ukjent nvdbId -1")
+        self.assertLess(results[2]["wait_seconds"], 1) # Not polled until the timeout
+
+if __name__ == "__main__":
+    unittest.main()